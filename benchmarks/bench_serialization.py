@@ -0,0 +1,71 @@
+"""
+Compare list_tasks response rendering: FastAPI's response_model path vs serializers.render_list.
+
+Run from the repository root:  python benchmarks/bench_serialization.py [items] [rounds]
+No database is needed; documents are generated in the shape Mongo returns them.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+
+import main  # noqa: E402
+from schemas import Task  # noqa: E402
+from serializers import render_list  # noqa: E402
+
+
+def make_docs(n: int) -> list:
+    user_id = str(ObjectId())
+    now = datetime(2024, 5, 17, 12, 0, 0)
+    return [
+        {
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "title": f"Read chapter {i}",
+            "course_id": str(ObjectId()),
+            "due_date": now + timedelta(days=i),
+            "status": "pending",
+            "xp_value": 10,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(n)
+    ]
+
+
+def run(items: int, rounds: int):
+    docs = make_docs(items)
+    route = next(r for r in main.app.routes if getattr(r, "path", None) == "/tasks" and "GET" in r.methods)
+    loop = asyncio.new_event_loop()
+
+    def response_model_path() -> bytes:
+        # What the handler used to do: build models, then let FastAPI validate, serialize and json.dumps them
+        models = [Task(**d) for d in docs]
+        content = loop.run_until_complete(serialize_response(field=route.response_field, response_content=models))
+        return JSONResponse(content).body
+
+    def fast_path() -> bytes:
+        return render_list(Task, docs)
+
+    assert json.loads(response_model_path()) == json.loads(fast_path()), "outputs differ"
+
+    baseline = min(timeit.repeat(response_model_path, number=rounds, repeat=5)) / rounds
+    fast = min(timeit.repeat(fast_path, number=rounds, repeat=5)) / rounds
+    print(f"list_tasks, {items} items")
+    print(f"  response_model + JSONResponse: {baseline * 1000:8.3f} ms")
+    print(f"  render_list (TypeAdapter):     {fast * 1000:8.3f} ms")
+    print(f"  speedup: {baseline / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500, int(sys.argv[2]) if len(sys.argv) > 2 else 50)
@@ -0,0 +1,97 @@
+"""
+In-process caches
+
+Small, per-worker caches for data that is read far more often than it changes.
+Callers invalidate entries explicitly when they write the underlying data; the TTL
+bounds how stale an entry can get when a write happens in another worker.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries also expire `ttl` seconds after being set"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key, _MISSING)
+        if item is not _MISSING:
+            expires_at, value = item
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        if self._data.pop(key, _MISSING) is not _MISSING:
+            self.invalidations += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class ExistenceCache:
+    """Remembers which ids exist (long TTL) and which were looked up and missing (short TTL)"""
+
+    def __init__(self, maxsize: int = 50000, ttl: float = 300.0, negative_ttl: float = 5.0):
+        self._present = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._absent = TTLCache(maxsize=maxsize, ttl=negative_ttl)
+
+    def lookup(self, key: Hashable):
+        """True or False if known, None if the database has to be asked"""
+        if self._present.get(key, False):
+            return True
+        if self._absent.get(key, False):
+            return False
+        return None
+
+    def remember(self, key: Hashable, exists: bool):
+        if exists:
+            self._absent.invalidate(key)
+            self._present.set(key, True)
+        else:
+            self._present.invalidate(key)
+            self._absent.set(key, True)
+
+    def forget(self, key: Hashable):
+        self._present.invalidate(key)
+        self._absent.invalidate(key)
+
+    def stats(self) -> dict:
+        return {"positive": self._present.stats(), "negative": self._absent.stats()}
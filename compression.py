@@ -0,0 +1,164 @@
+"""
+Response compression
+
+ASGI middleware that gzip- or brotli-encodes responses according to Accept-Encoding.
+Buffered bodies under `minimum_size` go out as-is; streamed bodies (format=stream/ndjson)
+are compressed chunk by chunk and flushed each time so NDJSON lines still arrive promptly.
+
+Shared responses on `cached_paths` that carry an ETag are compressed once: the encoded
+bytes are kept under (path, query, ETag, encoding), so later requests for the same version
+skip the compressor. brotli is optional; without the package only gzip is offered.
+"""
+
+import zlib
+from typing import Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+GZIP_LEVEL = 6
+# Low enough to compress on the fly; cached bodies are only encoded once either way
+BROTLI_QUALITY = 5
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best encoding we can produce for an Accept-Encoding header, or None for identity"""
+    offered = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    wildcard = offered.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for encoding in candidates:
+        q = offered.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    stream = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return stream.compress(body) + stream.flush()
+
+
+class _StreamEncoder:
+    """Incremental encoder that flushes after every chunk"""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._gz = None
+        else:
+            self._br = None
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self._br is not None:
+            return self._br.process(data) + self._br.flush()
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._br is not None:
+            return self._br.finish()
+        return self._gz.flush()
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        cached_paths: Iterable[str] = (),
+        cache: Optional[TTLCache] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cached_paths = frozenset(cached_paths)
+        self.cache = cache if cache is not None else TTLCache(maxsize=256, ttl=300.0)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder = None
+
+        async def send_compressed(message):
+            nonlocal start, encoder
+            if message["type"] == "http.response.start":
+                # Hold the headers until the first body chunk shows whether to compress
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                response_start, start = start, None
+                headers = MutableHeaders(raw=response_start["headers"])
+                if response_start["status"] in (204, 206, 304) or "content-encoding" in headers:
+                    await send(response_start)
+                    await send(message)
+                    encoder = False
+                    return
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    if len(body) < self.minimum_size:
+                        await send(response_start)
+                        await send(message)
+                        encoder = False
+                        return
+                    body = self._encode_whole(scope, headers.get("etag"), encoding, body)
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    await send(response_start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                # Streamed: the final length is unknown, so fall back to chunked transfer
+                encoder = _StreamEncoder(encoding)
+                headers["Content-Encoding"] = encoding
+                del headers["Content-Length"]
+                await send(response_start)
+
+            if not encoder:
+                await send(message)
+                return
+            data = encoder.chunk(body) if body else b""
+            if not more_body:
+                data += encoder.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _encode_whole(self, scope, etag: Optional[str], encoding: str, body: bytes) -> bytes:
+        if etag is None or scope["path"] not in self.cached_paths:
+            return compress(body, encoding)
+        key = (scope["path"], scope.get("query_string", b""), etag, encoding)
+        encoded = self.cache.get(key)
+        if encoded is None:
+            encoded = compress(body, encoding)
+            self.cache.set(key, encoded)
+        return encoded
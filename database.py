@@ -3,53 +3,762 @@ Database Helper Functions
 
 MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
+
+All helpers are coroutines backed by motor's asyncio client, so they must be
+awaited from async endpoints and never block the event loop.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from bson import json_util
+from pymongo import errors, monitoring
 from datetime import datetime, timezone
+import base64
+import logging
 import os
+import threading
 from dotenv import load_dotenv
-from typing import Union
+from typing import Iterable, List, Optional, Tuple, Union
 from pydantic import BaseModel
+from bson import ObjectId
+
+import metrics
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 _client = None
-db = None
+_database = None
 
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
 
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
-    if db is None:
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def client_options() -> dict:
+    """Connection pool and timeout settings for the client, read from the environment"""
+    return {
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE", 100),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE", 0),
+        "waitQueueTimeoutMS": _env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS", 10000),
+        "socketTimeoutMS": _env_int("MONGO_SOCKET_TIMEOUT_MS", 20000),
+    }
+
+
+class _PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Tracks connection pool occupancy per server from CMAP events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def _pool(self, address):
+        key = "%s:%s" % address
+        if key not in self._pools:
+            self._pools[key] = {"open": 0, "checked_out": 0, "waiting": 0, "check_out_failures": 0, "cleared": 0}
+        return self._pools[key]
+
+    def _bump(self, address, **deltas):
+        with self._lock:
+            pool = self._pool(address)
+            for field, delta in deltas.items():
+                pool[field] += delta
+
+    def pool_created(self, event):
+        self._bump(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop("%s:%s" % event.address, None)
+
+    def connection_created(self, event):
+        self._bump(event.address, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event.address, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._bump(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._bump(event.address, waiting=-1, check_out_failures=1)
+
+    def connection_checked_out(self, event):
+        self._bump(event.address, waiting=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._bump(event.address, checked_out=-1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {address: dict(pool) for address, pool in self._pools.items()}
+
+
+_pool_listener = _PoolStatsListener()
+
+
+# Operations slower than this are logged with their (redacted) filter shape
+SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_MS", "100"))
+
+# Where each command keeps the filter it runs
+_FILTER_FIELDS = {
+    "find": "filter", "count": "query", "distinct": "query", "findAndModify": "query",
+}
+_STATEMENT_FIELDS = {"update": ("updates", "q"), "delete": ("deletes", "q")}
+
+
+def _command_collection(command_name: str, command: dict) -> Optional[str]:
+    # Collection commands name their collection as the command's value; getMore carries it separately
+    if command_name == "getMore":
+        return command.get("collection")
+    target = command.get(command_name)
+    return target if isinstance(target, str) else None
+
+
+def query_shape(value):
+    """`value` with every literal replaced by "?", keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Same-shaped elements ($in lists, batched statements) collapse into one
+        shapes = []
+        for item in value:
+            shape = query_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+
+def _command_filter(command_name: str, command: dict):
+    if command_name in _FILTER_FIELDS:
+        return command.get(_FILTER_FIELDS[command_name])
+    if command_name in _STATEMENT_FIELDS:
+        field, key = _STATEMENT_FIELDS[command_name]
+        return [statement.get(key) for statement in command.get(field) or []]
+    if command_name == "aggregate":
+        return [stage for stage in command.get("pipeline") or [] if "$match" in stage]
+    return None
+
+
+def _reply_documents(command_name: str, reply: dict) -> int:
+    # Command monitoring only sees the reply, so this counts documents returned or written;
+    # docsExamined is only reported by explain and the profiler
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") is not None else 0
+    return int(reply.get("n") or 0)
+
+
+class _CommandStatsListener(monitoring.CommandListener):
+    """Feeds per-collection command latency into the metrics registry and logs slow commands.
+
+    Completion events don't carry the command, so what is needed from it is held from the
+    start event until the matching success or failure. Events arrive on driver threads, in
+    the context of the request that issued the command.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def started(self, event):
+        collection = _command_collection(event.command_name, event.command)
+        if collection is not None:
+            if plan_guard.mode:
+                plan_guard.check(event, collection)
+            pending = (collection, _command_filter(event.command_name, event.command), metrics.request_id.get())
+            with self._lock:
+                self._pending[(event.connection_id, event.request_id)] = pending
+
+    def _finish(self, event):
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), None)
+
+    def _slow(self, event, pending, documents, outcome: str):
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < SLOW_QUERY_MS:
+            return
+        collection, filter_doc, request_id = pending
+        logger.warning(
+            "Slow MongoDB %s on %s (%s): %.1f ms, %s docs, filter=%s, request_id=%s",
+            event.command_name, collection, outcome, duration_ms, documents,
+            json_util.dumps(query_shape(filter_doc)), request_id or "-",
+        )
+
+    def succeeded(self, event):
+        pending = self._finish(event)
+        if pending is not None:
+            documents = _reply_documents(event.command_name, event.reply)
+            metrics.db_latency.observe(event.duration_micros / 1e6, pending[0], event.command_name)
+            metrics.db_documents.inc(pending[0], event.command_name, amount=documents)
+            self._slow(event, pending, documents, "ok")
+
+    def failed(self, event):
+        pending = self._finish(event)
+        if pending is not None:
+            metrics.db_latency.observe(event.duration_micros / 1e6, pending[0], event.command_name)
+            metrics.db_failures.inc(pending[0], event.command_name)
+            self._slow(event, pending, "-", "failed")
+
+
+class QueryPlanError(Exception):
+    """A query ran with a plan the guard rejects (collection scan or in-memory sort)"""
+
+
+# Commands explain accepts, and the driver/session fields it must not be sent
+_EXPLAINABLE = {"find", "count", "distinct", "aggregate", "findAndModify", "update", "delete"}
+_NOT_EXPLAINED = {"lsid", "txnNumber", "startTransaction", "autocommit", "writeConcern", "signature"}
+
+
+def _winning_plans(node) -> list:
+    """Every winningPlan in an explain result (aggregations and sharded clusters nest them)"""
+    plans = []
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "winningPlan":
+                plans.append(value)
+            else:
+                plans.extend(_winning_plans(value))
+    elif isinstance(node, list):
+        for item in node:
+            plans.extend(_winning_plans(item))
+    return plans
+
+
+def _plan_stages(node, stages: list, indexes: list):
+    if isinstance(node, dict):
+        if isinstance(node.get("stage"), str):
+            stages.append(node["stage"])
+        if isinstance(node.get("indexName"), str):
+            indexes.append(node["indexName"])
+        for value in node.values():
+            _plan_stages(value, stages, indexes)
+    elif isinstance(node, list):
+        for item in node:
+            _plan_stages(item, stages, indexes)
+
+
+class QueryPlanGuard:
+    """Explains each distinct query shape once and flags collection scans and in-memory sorts.
+
+    Opt-in through QUERY_PLAN_GUARD: "warn" logs offending shapes, "raise" also records them
+    against the request that ran them so the app can fail that request. The explain runs
+    synchronously on the driver thread the first time a shape is seen, so the verdict is in
+    before the command itself returns.
+    """
+
+    def __init__(self, mode: Optional[str]):
+        self.mode = mode if mode in ("warn", "raise") else None
+        self._lock = threading.Lock()
+        self._plans = {}
+        self._violations = {}
+
+    def _explain(self, event, command: dict) -> dict:
+        explained = {k: v for k, v in command.items() if not k.startswith("$") and k not in _NOT_EXPLAINED}
+        return _client.delegate[event.database_name].command({"explain": explained, "verbosity": "queryPlanner"})
+
+    def check(self, event, collection: str):
+        command = event.command
+        if event.command_name not in _EXPLAINABLE or _client is None:
+            return
+        filter_doc = _command_filter(event.command_name, command)
+        sort = command.get("sort")
+        shape = json_util.dumps([collection, event.command_name, query_shape(filter_doc), sort])
+        with self._lock:
+            if shape in self._plans:
+                return
+            self._plans[shape] = None
+
+        entry = {
+            "collection": collection,
+            "command": event.command_name,
+            "filter": query_shape(filter_doc),
+            "sort": sort,
+        }
+        try:
+            explained = self._explain(event, command)
+        except errors.PyMongoError as e:
+            entry.update(stages=[], indexes=[], problems=[], error=str(e))
+        else:
+            stages, indexes = [], []
+            _plan_stages(_winning_plans(explained), stages, indexes)
+            problems = []
+            # A filterless, unsorted read of a whole collection is meant to scan it
+            if "COLLSCAN" in stages and (filter_doc or sort):
+                problems.append("COLLSCAN")
+            if "SORT" in stages:
+                problems.append("in-memory SORT")
+            entry.update(stages=stages, indexes=sorted(set(indexes)), problems=problems)
+        with self._lock:
+            self._plans[shape] = entry
+
+        if entry["problems"]:
+            logger.warning(
+                "Query plan for %s on %s uses %s: filter=%s sort=%s",
+                event.command_name, collection, " and ".join(entry["problems"]),
+                json_util.dumps(entry["filter"]), json_util.dumps(sort),
+            )
+            if self.mode == "raise":
+                with self._lock:
+                    self._violations.setdefault(metrics.request_id.get(), []).append(entry)
+
+    def raise_for(self, request_id: Optional[str]):
+        """Raise QueryPlanError if commands run for this request were flagged"""
+        with self._lock:
+            flagged = self._violations.pop(request_id, None)
+        if flagged:
+            raise QueryPlanError("; ".join(
+                "%s on %s uses %s" % (e["command"], e["collection"], " and ".join(e["problems"])) for e in flagged
+            ))
+
+    def discard(self, request_id: Optional[str]):
+        """Forget whatever was flagged for this request"""
+        with self._lock:
+            self._violations.pop(request_id, None)
+
+    def report(self) -> list:
+        """Every shape explained so far with its winning plan's stages and indexes"""
+        with self._lock:
+            return [dict(entry) for entry in self._plans.values() if entry is not None]
+
+
+class QueryPlanGuardMiddleware:
+    """Fails requests whose queries the guard flagged; install inside RequestIdMiddleware.
+
+    Checked as the response starts, which covers buffered responses, and again once the app
+    returns, for queries a streamed body ran after that. The request's entries are dropped
+    either way, so a later request reusing its X-Request-ID starts clean.
+    """
+
+    def __init__(self, app, guard: QueryPlanGuard):
+        self.app = app
+        self.guard = guard
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid = metrics.request_id.get()
+
+        async def send_checked(message):
+            if message["type"] == "http.response.start":
+                self.guard.raise_for(rid)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_checked)
+            self.guard.raise_for(rid)
+        finally:
+            self.guard.discard(rid)
+
+
+plan_guard = QueryPlanGuard(os.getenv("QUERY_PLAN_GUARD"))
+_command_listener = _CommandStatsListener()
+
+
+async def connect_db():
+    """Create the shared client; call once from application startup"""
+    global _client, _database
+    if _client is not None or not (database_url and database_name):
+        return
+    _client = AsyncIOMotorClient(database_url, event_listeners=[_pool_listener, _command_listener], **client_options())
+    _database = _client[database_name]
+
+
+async def close_db():
+    """Close the shared client and its pooled connections; call from application shutdown"""
+    global _client, _database
+    if _client is not None:
+        _client.close()
+    _client = None
+    _database = None
+
+
+def pool_stats() -> dict:
+    """Current pool settings and per-server connection occupancy"""
+    options = client_options()
+    return {
+        "connected": _client is not None,
+        "max_pool_size": options["maxPoolSize"],
+        "min_pool_size": options["minPoolSize"],
+        "wait_queue_timeout_ms": options["waitQueueTimeoutMS"],
+        "servers": _pool_listener.snapshot(),
+    }
+
+
+def _require_db():
+    if _database is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    return _database
+
+
+class _DatabaseProxy:
+    """Forwards to the database opened by connect_db, so `from database import db` stays valid"""
+
+    def __getitem__(self, collection_name: str):
+        return _require_db()[collection_name]
+
+    def __getattr__(self, name: str):
+        return getattr(_require_db(), name)
+
+
+db = _DatabaseProxy()
+
+
+def collection_indexes(models: Iterable[type]) -> dict:
+    """Map each model's collection (class name lowercased) to its declared __indexes__"""
+    return {model.__name__.lower(): list(getattr(model, "__indexes__", [])) for model in models}
+
+
+async def ensure_indexes(models: Iterable[type]):
+    """Create every declared index; safe to run on each startup since existing indexes are left alone"""
+    if _database is None:
+        return
+    for collection_name, indexes in collection_indexes(models).items():
+        for index in indexes:
+            spec = dict(index.document)
+            keys = list(spec.pop("key").items())
+            try:
+                await _database[collection_name].create_index(keys, **spec)
+            except errors.ServerSelectionTimeoutError as e:
+                logger.warning("Skipping index bootstrap, MongoDB unreachable: %s", e)
+                return
+            except Exception as e:
+                # e.g. duplicates blocking a unique index; keep serving and let index_report show the gap
+                logger.warning("Could not create index %s on %s: %s", spec["name"], collection_name, e)
+
+
+async def ensure_collections(models: Iterable[type]):
+    """Create the time-series collections models declare via __timeseries__.
+
+    Runs before ensure_indexes, which would otherwise create them as regular collections.
+    An existing regular collection cannot be converted in place, so it is only reported;
+    migrations.py moves its documents over.
+    """
+    if _database is None:
+        return
+    wanted = {model.__name__.lower(): model.__timeseries__ for model in models if getattr(model, "__timeseries__", None)}
+    if not wanted:
+        return
+    try:
+        existing = {
+            info["name"]: info.get("type")
+            async for info in _database.list_collections(filter={"name": {"$in": list(wanted)}})
+        }
+    except errors.ServerSelectionTimeoutError as e:
+        logger.warning("Skipping collection bootstrap, MongoDB unreachable: %s", e)
+        return
+    for collection_name, options in wanted.items():
+        if collection_name in existing:
+            if existing[collection_name] != "timeseries":
+                logger.warning(
+                    "%s is a regular collection, not time-series %s; run `python migrations.py %s_timeseries`",
+                    collection_name, options, collection_name,
+                )
+            continue
+        try:
+            await _database.create_collection(collection_name, timeseries=options)
+        except errors.CollectionInvalid:
+            pass  # another worker created it first
+        except Exception as e:
+            logger.warning("Could not create time-series collection %s: %s", collection_name, e)
+
 
+async def index_report(models: Iterable[type]) -> dict:
+    """Declared indexes missing from each collection, and existing indexes nobody declared"""
+    database = _require_db()
+    report = {}
+    for collection_name, indexes in collection_indexes(models).items():
+        declared = {index.document["name"] for index in indexes}
+        existing = set(await database[collection_name].index_information()) - {"_id_"}
+        report[collection_name] = {
+            "missing": sorted(declared - existing),
+            "extra": sorted(existing - declared),
+        }
+    return report
+
+
+def _to_object_id(document_id: Union[str, ObjectId]) -> ObjectId:
+    return document_id if isinstance(document_id, ObjectId) else ObjectId(document_id)
+
+
+# Helper functions for common database operations
+def _prepare_document(data: Union[BaseModel, dict], now: datetime) -> dict:
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
         data_dict = data.model_dump()
     else:
         data_dict = data.copy()
 
-    data_dict['created_at'] = datetime.now(timezone.utc)
-    data_dict['updated_at'] = datetime.now(timezone.utc)
+    # Models dump their unset alias as "id"; let MongoDB assign the _id instead
+    if data_dict.get("id") is None:
+        data_dict.pop("id", None)
 
-    result = db[collection_name].insert_one(data_dict)
-    return str(result.inserted_id)
+    data_dict['created_at'] = data_dict.get('created_at') or now
+    data_dict['updated_at'] = data_dict.get('updated_at') or now
+    return data_dict
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
-    if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
+
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamps and return it with its _id"""
+    database = _require_db()
+
+    data_dict = _prepare_document(data, datetime.now(timezone.utc))
+    result = await database[collection_name].insert_one(data_dict)
+    data_dict['_id'] = str(result.inserted_id)
+    return data_dict
+
+
+async def create_documents(collection_name: str, items: List[Union[BaseModel, dict]], ordered: bool = False):
+    """Insert many documents with timestamps in a single insert_many.
+
+    Returns a list aligned with `items` holding each stored document (with its _id), or None
+    where the insert failed, and a dict of failure messages keyed by item position.
+    """
+    database = _require_db()
+
+    now = datetime.now(timezone.utc)
+    docs = [_prepare_document(data, now) for data in items]
+    if not docs:
+        return [], {}
+
+    failed = {}
+    try:
+        await database[collection_name].insert_many(docs, ordered=ordered)
+    except errors.BulkWriteError as e:
+        failed = {err["index"]: err.get("errmsg", "Write failed") for err in e.details.get("writeErrors", [])}
+        if ordered:
+            # An ordered insert stops at its first error
+            first = min(failed)
+            failed.update({i: "Not attempted" for i in range(first + 1, len(docs))})
+
+    results = []
+    for i, data_dict in enumerate(docs):
+        if i in failed:
+            results.append(None)
+        else:
+            # insert_many assigned the _id on the dict it sent
+            data_dict['_id'] = str(data_dict['_id'])
+            results.append(data_dict)
+    return results, failed
+
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get documents from collection, optionally only the fields in `projection`"""
+    database = _require_db()
+
+    cursor = database[collection_name].find(filter_dict or {}, projection)
     if limit:
         cursor = cursor.limit(limit)
-    
-    return list(cursor)
+
+    return await cursor.to_list(length=limit)
+
+
+def iter_documents(
+    collection_name: str,
+    filter_dict: dict = None,
+    sort: List[Tuple[str, int]] = None,
+    limit: int = None,
+    projection: dict = None,
+    cursor: str = None,
+):
+    """Stream documents with `async for`, holding only one driver batch in memory at a time.
+
+    Takes the same keyset `cursor` as find_page. The query is built eagerly, so a bad cursor
+    raises ValueError here rather than part-way through iteration.
+    """
+    database = _require_db()
+
+    query = filter_dict or {}
+    if cursor:
+        query = {"$and": [query, keyset_filter(sort, decode_cursor(cursor))]}
+
+    found = database[collection_name].find(query, projection)
+    if sort:
+        found = found.sort(sort)
+    if limit:
+        found = found.limit(limit)
+    return found
+
+
+async def get_latest_document(
+    collection_name: str,
+    filter_dict: dict = None,
+    since: datetime = None,
+    until: datetime = None,
+    time_field: str = "created_at",
+):
+    """Get the newest document matching the filter within [since, until) on time_field.
+
+    Pair the filter fields with time_field in an index (e.g. user_id + created_at) to make
+    this a single index seek.
+    """
+    database = _require_db()
+
+    query = dict(filter_dict or {})
+    time_range = {}
+    if since is not None:
+        time_range["$gte"] = since
+    if until is not None:
+        time_range["$lt"] = until
+    if time_range:
+        query[time_field] = time_range
+
+    return await database[collection_name].find_one(query, sort=[(time_field, -1)])
+
+
+async def update_document(collection_name: str, document_id: Union[str, ObjectId], data: dict):
+    """Set fields on a single document by _id, refreshing updated_at"""
+    database = _require_db()
+
+    fields = dict(data)
+    fields['updated_at'] = datetime.now(timezone.utc)
+    result = await database[collection_name].update_one({"_id": _to_object_id(document_id)}, {"$set": fields})
+    return result.modified_count > 0
+
+
+async def delete_document(collection_name: str, document_id: Union[str, ObjectId]):
+    """Delete a single document by _id"""
+    database = _require_db()
+
+    result = await database[collection_name].delete_one({"_id": _to_object_id(document_id)})
+    return result.deleted_count > 0
+
+
+def encode_cursor(values: list) -> str:
+    """Opaque URL-safe token holding the sort-key values of the last document on a page"""
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+
+
+# Sort-key values a cursor may carry. Anything else (a dict in particular) would be read as
+# query operators once the value lands in a keyset filter.
+_CURSOR_SCALARS = (str, int, float, bool, datetime, ObjectId, type(None))
+
+
+def _cursor_value_ok(value) -> bool:
+    if isinstance(value, list):
+        return all(_cursor_value_ok(item) for item in value)
+    return isinstance(value, _CURSOR_SCALARS)
+
+
+def decode_cursor(token: str) -> list:
+    """Inverse of encode_cursor; raises ValueError for tokens it did not produce"""
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or not _cursor_value_ok(values):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def _after(field: str, direction: int, value) -> Optional[dict]:
+    # MongoDB sorts null/missing before every date or number, so they lead ascending and trail descending
+    if direction == 1:
+        return {field: {"$ne": None}} if value is None else {field: {"$gt": value}}
+    if value is None:
+        return None
+    if field == "_id":
+        return {field: {"$lt": value}}
+    return {"$or": [{field: {"$lt": value}}, {field: None}]}
+
+
+def keyset_filter(sort: List[Tuple[str, int]], values: list) -> dict:
+    """Filter matching documents that come strictly after `values` in `sort` order"""
+    if len(values) != len(sort) or not all(isinstance(value, _CURSOR_SCALARS) for value in values):
+        raise ValueError("Invalid cursor")
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        after = _after(field, direction, values[i])
+        if after is None:
+            continue
+        clause = {prev_field: prev_value for (prev_field, _), prev_value in zip(sort[:i], values[:i])}
+        clause.update(after)
+        clauses.append(clause)
+    return {"$or": clauses} if clauses else {"_id": {"$exists": False}}
+
+
+async def find_page(
+    collection_name: str,
+    filter_dict: dict,
+    sort: List[Tuple[str, int]],
+    limit: int,
+    cursor: str = None,
+    projection: dict = None,
+):
+    """Get one page of documents in `sort` order plus the cursor for the next page (None on the last page).
+
+    `sort` must end with a unique field (usually _id) so the order is total; with an index on
+    the same keys every page is an index seek, no matter how deep.
+    """
+    database = _require_db()
+
+    query = filter_dict or {}
+    if cursor:
+        query = {"$and": [query, keyset_filter(sort, decode_cursor(cursor))]}
+
+    # The cursor is built from the sort keys, so an inclusion projection has to fetch them too
+    hidden = []
+    if projection and any(projection.values()):
+        projection = dict(projection)
+        for field, _ in sort:
+            if field not in projection and field != "_id":
+                projection[field] = 1
+                hidden.append(field)
+
+    docs = await database[collection_name].find(query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor([docs[-1].get(field) for field, _ in sort])
+    for doc in docs:
+        for field in hidden:
+            doc.pop(field, None)
+    return docs, next_cursor
+
+
+async def find_changes(
+    collection_name: str,
+    filter_dict: dict,
+    field: str,
+    mark: Optional[list],
+    until: datetime,
+    limit: int,
+    projection: dict = None,
+):
+    """Get up to `limit` documents whose `field` moved past `mark` ([value, _id]) and is no later than `until`.
+
+    Returns (docs, mark, has_more); the new mark sits on the last document returned, or stays
+    put when nothing changed. Documents without `field` come first and only on a first pull.
+    `projection` must keep `field`, which the new mark is read from.
+    """
+    database = _require_db()
+    sort = [(field, 1), ("_id", 1)]
+    clauses = [filter_dict or {}, {field: {"$not": {"$gt": until}}}]
+    if mark:
+        clauses.append(keyset_filter(sort, mark))
+    docs = await database[collection_name].find({"$and": clauses}, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if docs:
+        mark = [docs[-1].get(field), docs[-1]["_id"]]
+    return docs, mark, has_more
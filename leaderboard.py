@@ -0,0 +1,214 @@
+"""
+In-process XP leaderboard
+
+An indexable skip list keeps users ordered by (xp desc, user id asc), the same order
+as the Mongo leaderboard query, so top-N, rank lookups and neighbourhoods are O(log n)
+without touching the database. Each worker keeps its own copy: writes it performs are
+applied immediately, and a periodic reload from Mongo picks up everyone else's.
+"""
+
+import random
+from typing import List, Optional, Tuple
+
+_MAX_LEVEL = 32
+_P = 0.25
+
+
+class _Node:
+    __slots__ = ("key", "forward", "span")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.forward = [None] * level
+        # span[i]: how many level-0 steps forward[i] jumps over
+        self.span = [0] * level
+
+
+class RankedSet:
+    """Sorted set of unique keys supporting insert, remove, rank and positional access in O(log n)"""
+
+    def __init__(self):
+        self._head = _Node(None, _MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _random_level() -> int:
+        level = 1
+        while level < _MAX_LEVEL and random.random() < _P:
+            level += 1
+        return level
+
+    def insert(self, key):
+        """Add a key that is not already present"""
+        update = [self._head] * _MAX_LEVEL
+        rank = [0] * _MAX_LEVEL
+        x = self._head
+        for i in reversed(range(self._level)):
+            rank[i] = 0 if i == self._level - 1 else rank[i + 1]
+            while x.forward[i] is not None and x.forward[i].key < key:
+                rank[i] += x.span[i]
+                x = x.forward[i]
+            update[i] = x
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                rank[i] = 0
+                update[i] = self._head
+                self._head.span[i] = self._size
+            self._level = level
+
+        node = _Node(key, level)
+        for i in range(level):
+            node.forward[i] = update[i].forward[i]
+            update[i].forward[i] = node
+            node.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = (rank[0] - rank[i]) + 1
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+        self._size += 1
+
+    def remove(self, key) -> bool:
+        """Drop a key; returns False if it was not present"""
+        update = [self._head] * _MAX_LEVEL
+        x = self._head
+        for i in reversed(range(self._level)):
+            while x.forward[i] is not None and x.forward[i].key < key:
+                x = x.forward[i]
+            update[i] = x
+
+        x = x.forward[0]
+        if x is None or x.key != key:
+            return False
+        for i in range(self._level):
+            if update[i].forward[i] is x:
+                update[i].span[i] += x.span[i] - 1
+                update[i].forward[i] = x.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def rank(self, key, inclusive: bool = False) -> int:
+        """Number of keys ordered before `key` (or at it, when inclusive)"""
+        x = self._head
+        traversed = 0
+        for i in reversed(range(self._level)):
+            while x.forward[i] is not None and (
+                x.forward[i].key < key or (inclusive and x.forward[i].key == key)
+            ):
+                traversed += x.span[i]
+                x = x.forward[i]
+        return traversed
+
+    def slice(self, start: int, stop: int) -> list:
+        """Keys at positions [start, stop) in order"""
+        start = max(start, 0)
+        stop = min(stop, self._size)
+        if start >= stop:
+            return []
+        # Walk down to the node at 1-based position start + 1, then along level 0
+        target = start + 1
+        x = self._head
+        traversed = 0
+        for i in reversed(range(self._level)):
+            while x.forward[i] is not None and traversed + x.span[i] <= target:
+                traversed += x.span[i]
+                x = x.forward[i]
+            if traversed == target:
+                break
+        keys = []
+        while x is not None and len(keys) < stop - start:
+            keys.append(x.key)
+            x = x.forward[0]
+        return keys
+
+
+class Leaderboard:
+    """Users ranked by XP, with the name/streak needed to render leaderboard rows"""
+
+    def __init__(self):
+        self._ranks = RankedSet()
+        self._users = {}
+        self.ready = False
+        # Bumped on every change so callers can tell when the ordering may have moved
+        self.version = 0
+        # Changes made while a replacement board is being rebuilt, replayed onto it by replace()
+        self._journal = None
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    @staticmethod
+    def _key(user_id: str, xp: int) -> Tuple[int, str]:
+        return (-xp, user_id)
+
+    def update(self, user_id: str, xp: int, name: Optional[str] = None, streak: Optional[int] = None):
+        """Insert a user or move them to their new XP"""
+        xp = int(xp or 0)
+        if self._journal is not None:
+            self._journal.append(("update", (user_id, xp, name, streak)))
+        entry = self._users.get(user_id)
+        if entry is None:
+            entry = {"user_id": user_id, "name": name or "", "xp": xp, "streak": int(streak or 0)}
+            self._users[user_id] = entry
+            self._ranks.insert(self._key(user_id, xp))
+        else:
+            if entry["xp"] != xp:
+                self._ranks.remove(self._key(user_id, entry["xp"]))
+                self._ranks.insert(self._key(user_id, xp))
+                entry["xp"] = xp
+            if name is not None:
+                entry["name"] = name
+            if streak is not None:
+                entry["streak"] = int(streak)
+        self.version += 1
+
+    def remove(self, user_id: str):
+        if self._journal is not None:
+            self._journal.append(("remove", (user_id,)))
+        entry = self._users.pop(user_id, None)
+        if entry is not None:
+            self._ranks.remove(self._key(user_id, entry["xp"]))
+            self.version += 1
+
+    def begin_rebuild(self):
+        """Start recording changes, so a board rebuilt meanwhile (e.g. reloaded from Mongo) can catch up"""
+        self._journal = []
+
+    def cancel_rebuild(self):
+        self._journal = None
+
+    def replace(self, fresh: "Leaderboard"):
+        """Swap in a board rebuilt elsewhere in one step, first replaying changes made since begin_rebuild()"""
+        for method, args in self._journal or ():
+            getattr(fresh, method)(*args)
+        self._journal = None
+        self._ranks, self._users = fresh._ranks, fresh._users
+        self.ready = True
+        self.version += 1
+
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self._users.get(user_id)
+        return dict(entry) if entry else None
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """1-based position of a user, or None if unknown"""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        return self._ranks.rank(self._key(user_id, entry["xp"])) + 1
+
+    def page(self, start: int, limit: int) -> List[dict]:
+        """Rows at 0-based positions [start, start + limit)"""
+        return [dict(self._users[user_id]) for _, user_id in self._ranks.slice(start, start + limit)]
+
+    def position_after(self, xp: int, user_id: str) -> int:
+        """0-based position of the first row ordered after (xp, user_id)"""
+        return self._ranks.rank(self._key(user_id, xp), inclusive=True)
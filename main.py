@@ -1,16 +1,119 @@
-from datetime import datetime, date, timedelta
-from typing import Optional, List
-from fastapi import FastAPI, HTTPException, Query
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, date, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional, List
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field, EmailStr
+from bson.errors import InvalidId
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 
 # Database utilities are pre-configured in this environment
 # Schemas must be defined in schemas.py
-from database import db, create_document, get_documents
-from schemas import User, Course, Task, Mood, Post, Reply
+from database import (
+    db, connect_db, close_db, pool_stats, ensure_collections, ensure_indexes, index_report, plan_guard, QueryPlanGuardMiddleware,
+    create_document, create_documents, get_latest_document, find_page, find_changes, iter_documents, encode_cursor, decode_cursor, keyset_filter,
+)
+from schemas import User, Course, Task, Mood, MoodRollup, Post, Reply, ReplyBucket, XpBucket, Tombstone, LEGACY_REPLY_COUNT
+from leaderboard import Leaderboard
+from cache import ExistenceCache, TTLCache
+from compression import CompressionMiddleware
+from metrics import MetricsMiddleware, RequestIdMiddleware, REQUEST_ID_HEADER, registry as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from serializers import FastJSONResponse, render_list, render_model
+
+logger = logging.getLogger(__name__)
+
+# Models whose collections this API reads; their __indexes__ are ensured at startup
+INDEXED_MODELS = [User, Course, Task, Mood, MoodRollup, Post, ReplyBucket, XpBucket, Tombstone]
+
+# In-memory XP ranking for this worker; reloaded from Mongo to pick up other workers' awards
+ranking = Leaderboard()
+LEADERBOARD_RECONCILE_SECONDS = int(os.getenv("LEADERBOARD_RECONCILE_SECONDS", "300"))
+LEADER_FIELDS = {"name": 1, "xp": 1, "streak": 1}
+
+
+# Flamo suggestions per (user, day); dropped whenever that user's tasks or moods change
+suggestion_cache = TTLCache(
+    maxsize=int(os.getenv("SUGGEST_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("SUGGEST_CACHE_TTL_SECONDS", "60")),
+)
+
+
+def invalidate_suggestion(user_id: str):
+    suggestion_cache.invalidate((user_id, date.today()))
+
+
+# Known-present / known-missing (collection, id) pairs, so write paths skip existence reads
+ref_cache = ExistenceCache(
+    maxsize=int(os.getenv("REF_CACHE_SIZE", "50000")),
+    ttl=float(os.getenv("REF_CACHE_TTL_SECONDS", "300")),
+    negative_ttl=float(os.getenv("REF_CACHE_NEGATIVE_TTL_SECONDS", "5")),
+)
+
+
+async def ensure_exists(collection_name: str, id_str: str, detail: str):
+    """Raise 400 with `detail` unless the referenced document exists"""
+    key = (collection_name, id_str)
+    exists = ref_cache.lookup(key)
+    if exists is None:
+        exists = await db[collection_name].find_one({"_id": oid(id_str)}, {"_id": 1}) is not None
+        ref_cache.remember(key, exists)
+    if not exists:
+        raise HTTPException(status_code=400, detail=detail)
+
+
+async def reload_leaderboard():
+    # Awards applied to the live board while the cursor runs are replayed onto the new one,
+    # so a user the cursor has already passed doesn't fall back to their older XP
+    ranking.begin_rebuild()
+    try:
+        fresh = Leaderboard()
+        async for u in db["user"].find({}, LEADER_FIELDS):
+            fresh.update(str(u["_id"]), u.get("xp", 0), u.get("name"), u.get("streak", 0))
+    except BaseException:
+        ranking.cancel_rebuild()
+        raise
+    ranking.replace(fresh)
+
+
+async def reconcile_leaderboard():
+    while True:
+        await asyncio.sleep(LEADERBOARD_RECONCILE_SECONDS)
+        try:
+            await reload_leaderboard()
+        except Exception as e:
+            logger.warning("Leaderboard reload failed: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One client (and connection pool) per worker process, opened and closed with the app
+    await connect_db()
+    await ensure_collections(INDEXED_MODELS)
+    await ensure_indexes(INDEXED_MODELS)
+    try:
+        await reload_leaderboard()
+    except Exception as e:
+        # /leaderboard falls back to querying Mongo until a reload succeeds
+        logger.warning("Leaderboard seed failed: %s", e)
+    reconciler = asyncio.create_task(reconcile_leaderboard())
+    try:
+        yield
+    finally:
+        reconciler.cancel()
+        await close_db()
+
 
-app = FastAPI(title="UNIVO API", version="0.1.0")
+app = FastAPI(title="UNIVO API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,7 +121,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", REQUEST_ID_HEADER],
+)
+
+# Encoded bodies of shared, ETagged responses, keyed by (path, query, ETag, encoding)
+compressed_cache = TTLCache(
+    maxsize=int(os.getenv("COMPRESS_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("COMPRESS_CACHE_TTL_SECONDS", "300")),
+)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESS_MIN_BYTES", "1024")),
+    cached_paths=["/leaderboard", "/posts"],
+    cache=compressed_cache,
 )
+if plan_guard.mode == "raise":
+    # Fail any request whose queries the plan guard flagged (meant for test and CI runs);
+    # inside the metrics so those failures are counted as the 500s they are
+    app.add_middleware(QueryPlanGuardMiddleware, guard=plan_guard)
+# Request timings include compression; the request id wraps everything
+app.add_middleware(MetricsMiddleware, routes=app.router.routes)
+app.add_middleware(RequestIdMiddleware)
 
 
 # Utility functions
@@ -34,6 +157,217 @@ def now_ts() -> datetime:
     return datetime.utcnow()
 
 
+# Deleted documents leave a tombstone for /sync; a token older than this can no longer be served
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+
+
+async def bury(collection_name: str, doc_id: str, user_id: str):
+    """Record that a document was deleted, so /sync reports it; call it from whatever deletes one"""
+    ts = now_ts()
+    await db["tombstone"].insert_one({
+        "collection": collection_name,
+        "doc_id": doc_id,
+        "user_id": user_id,
+        "deleted_at": ts,
+        "expires_at": ts + timedelta(days=TOMBSTONE_RETENTION_DAYS),
+    })
+
+
+# Keyset page orders; each matches an index declared in schemas.py and ends with _id
+TASK_ORDER = [("due_date", 1), ("_id", 1)]
+COURSE_ORDER = [("created_at", 1), ("_id", 1)]
+POST_ORDER = [("created_at", -1), ("_id", -1)]
+
+# Replies per replybucket document; keeps every reply write a small constant-size update
+REPLY_BUCKET_SIZE = 100
+
+LEADERBOARD_ORDER = [("xp", -1), ("_id", 1)]
+XP_BUCKET_ORDER = [("xp", -1), ("user_id", 1)]
+
+
+async def paginate(
+    response: Response,
+    collection_name: str,
+    q: dict,
+    sort: list,
+    limit: int,
+    cursor: Optional[str],
+    projection: Optional[dict] = None,
+) -> list:
+    """Fetch one keyset page; the token for the following page goes out in the X-Next-Cursor header"""
+    try:
+        docs, next_cursor = await find_page(collection_name, q, sort, limit, cursor, projection)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return docs
+
+
+def field_projection(model: type, fields: Optional[str], hidden: tuple = ()) -> Optional[dict]:
+    """Mongo projection for a comma-separated list of the model's field names; _id always comes back"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    allowed = set(model.model_fields) - {"id"} - set(hidden)
+    unknown = [name for name in names if name not in allowed and name not in ("id", "_id")]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return {name: 1 for name in names if name not in ("id", "_id")} or {"_id": 1}
+
+
+PASSTHROUGH_HEADERS = ("X-Next-Cursor", "ETag", "Last-Modified")
+
+
+def page_headers(response: Response) -> Optional[dict]:
+    # Headers set on the injected response are dropped when a handler returns its own Response
+    headers = {name: response.headers[name] for name in PASSTHROUGH_HEADERS if name in response.headers}
+    return headers or None
+
+
+# Conditional GET: validators are derived from cheap indexed reads (or in-memory versions),
+# so an unchanged resource is answered with 304 before the real query or any serialization.
+# Tags are salted per process for data that lives in process memory (the leaderboard).
+PROCESS_ETAG_SALT = os.urandom(8).hex()
+
+
+def make_etag(*parts) -> str:
+    return 'W/"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def check_not_modified(request: Request, response: Response, etag: str, last_modified: Optional[datetime] = None) -> Optional[Response]:
+    """Attach validators to the response; return a 304 if the client's copy is still current"""
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+
+    fresh = False
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        fresh = "*" in tags or etag.removeprefix("W/") in tags
+    elif last_modified is not None and request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"])
+            fresh = last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+        except (TypeError, ValueError):
+            fresh = False
+    if fresh:
+        return Response(status_code=304, headers=page_headers(response))
+    return None
+
+
+async def collection_not_modified(request: Request, response: Response, collection_name: str, scope: dict) -> Optional[Response]:
+    """Conditional GET for a list over `scope`, keyed on its newest updated_at (one index seek)"""
+    lookups = [db[collection_name].find_one(scope, {"updated_at": 1}, sort=[("updated_at", -1), ("_id", -1)])]
+    if "user_id" in scope:
+        # Deletes don't move updated_at, but they leave a tombstone
+        lookups.append(db["tombstone"].find_one(
+            {"user_id": scope["user_id"], "collection": collection_name}, {"deleted_at": 1}, sort=[("deleted_at", -1), ("_id", -1)]
+        ))
+    latest, buried = (await asyncio.gather(*lookups) + [None])[:2]
+    last_modified = (latest or {}).get("updated_at")
+    if buried and (last_modified is None or buried["deleted_at"] > last_modified):
+        last_modified = buried["deleted_at"]
+    etag = make_etag(
+        request.url.path, sorted(request.query_params.multi_items()),
+        last_modified, (latest or {}).get("_id"), (buried or {}).get("_id"),
+    )
+    return check_not_modified(request, response, etag, last_modified)
+
+
+def partial_response(response: Response, docs: list) -> JSONResponse:
+    """Send projected documents as-is; they can't satisfy the full response model"""
+    return JSONResponse(jsonable_encoder(docs, custom_encoder={ObjectId: str}), headers=page_headers(response))
+
+
+def fast_list(response: Response, model: type, docs: list) -> FastJSONResponse:
+    """Build `model` rows once and serialize them straight to bytes, skipping response_model re-validation"""
+    return FastJSONResponse(render_list(model, docs), headers=page_headers(response))
+
+
+# Response formats for list endpoints: a buffered page (json), or the whole result streamed
+# from the driver cursor as one JSON array (stream) or one document per line (ndjson)
+LIST_FORMATS = "^(json|stream|ndjson)$"
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def stream_documents(
+    fmt: str,
+    model: Optional[type],
+    collection_name: str,
+    q: dict,
+    sort: list,
+    limit: Optional[int],
+    cursor: Optional[str],
+    projection: Optional[dict] = None,
+    headers: Optional[dict] = None,
+) -> StreamingResponse:
+    """Stream matching documents as they arrive from Mongo, so memory stays flat and the first byte goes out early.
+
+    Documents are rendered through `model`, or sent as-is when it is None (fields= projections).
+    """
+    try:
+        docs = iter_documents(collection_name, q, sort, limit, projection, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def encode(doc: dict) -> bytes:
+        if model is None:
+            return json.dumps(jsonable_encoder(doc, custom_encoder={ObjectId: str})).encode()
+        return model(**doc).model_dump_json(by_alias=True).encode()
+
+    async def body():
+        opening, separator, closing = (b"[", b",", b"]") if fmt == "stream" else (b"", b"\n", b"\n")
+        chunk, first = bytearray(opening), True
+        async for doc in docs:
+            if not first:
+                chunk += separator
+            chunk += encode(doc)
+            first = False
+            if len(chunk) >= STREAM_CHUNK_BYTES:
+                yield bytes(chunk)
+                chunk.clear()
+        if fmt == "stream" or not first:
+            chunk += closing
+        yield bytes(chunk)
+
+    return StreamingResponse(body(), media_type="application/json" if fmt == "stream" else "application/x-ndjson", headers=headers)
+
+
+# Rollup windows shared by XP buckets and mood rollups: calendar day and ISO week
+WINDOWS = ("day", "week")
+# XP buckets are kept for this long after their period ends
+XP_BUCKET_RETENTION_DAYS = int(os.getenv("XP_BUCKET_RETENTION_DAYS", "35"))
+
+
+def period_of(ts: datetime, window: str):
+    """Key, start and end of the day or ISO week containing ts"""
+    day_start = datetime(ts.year, ts.month, ts.day)
+    if window == "day":
+        return day_start.strftime("%Y-%m-%d"), day_start, day_start + timedelta(days=1)
+    iso = ts.isocalendar()
+    week_start = day_start - timedelta(days=ts.weekday())
+    return f"{iso.year}-W{iso.week:02d}", week_start, week_start + timedelta(days=7)
+
+
+async def record_xp(user_id: str, xp_by_course: dict):
+    """Add awarded XP to the user's current day and week buckets, overall and per course, in one bulk write"""
+    now = now_ts()
+    scopes = [(None, sum(xp_by_course.values()))] + [(c, xp) for c, xp in xp_by_course.items() if c]
+    ops = []
+    for window in WINDOWS:
+        period, _, end = period_of(now, window)
+        for course_id, xp in scopes:
+            ops.append(UpdateOne(
+                {"window": window, "period": period, "course_id": course_id, "user_id": user_id},
+                {"$inc": {"xp": xp}, "$set": {"expires_at": end + timedelta(days=XP_BUCKET_RETENTION_DAYS)}},
+                upsert=True,
+            ))
+    await db["xpbucket"].bulk_write(ops, ordered=False)
+
+
 # Health / test
 @app.get("/test")
 async def test_connection():
@@ -45,6 +379,31 @@ async def test_connection():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/db/pool")
+async def db_pool():
+    return pool_stats()
+
+
+@app.get("/db/indexes")
+async def db_indexes():
+    return await index_report(INDEXED_MODELS)
+
+
+@app.get("/db/query-plans")
+async def db_query_plans():
+    return {"mode": plan_guard.mode, "plans": plan_guard.report()}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {"suggestions": suggestion_cache.stats(), "references": ref_cache.stats(), "compressed": compressed_cache.stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 # Users
 class CreateUserRequest(BaseModel):
     email: EmailStr
@@ -52,81 +411,195 @@ class CreateUserRequest(BaseModel):
 
 
 @app.post("/users", response_model=User)
-async def create_or_get_user(payload: CreateUserRequest):
-    existing = await db["user"].find_one({"email": payload.email})
-    if existing:
-        return User(**existing)
+async def create_or_get_user(payload: CreateUserRequest, response: Response):
+    """Return the user with this email, creating it if needed; 201 means it was just created"""
+    new_id = ObjectId()
     data = User(
-        email=payload.email,
         name=payload.name,
+        email=payload.email,
         xp=0,
         streak=0,
         last_checkin=None,
         created_at=now_ts(),
         updated_at=now_ts(),
-    ).model_dump()
-    doc = await create_document("user", data)
+    ).model_dump(exclude={"id", "email"})
+    data["_id"] = new_id
+    # One round-trip: the unique email index makes the upsert the single source of truth
+    try:
+        doc = await db["user"].find_one_and_update(
+            {"email": payload.email},
+            {"$setOnInsert": data},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # A concurrent signup for the same email inserted first; theirs is the user
+        doc = await db["user"].find_one({"email": payload.email})
+    if doc["_id"] == new_id:
+        response.status_code = 201
+        ref_cache.remember(("user", str(new_id)), True)
+        ranking.update(str(new_id), doc.get("xp", 0), doc.get("name"), doc.get("streak", 0))
     return User(**doc)
 
 
 @app.get("/users/{user_id}", response_model=User)
-async def get_user(user_id: str):
+async def get_user(request: Request, response: Response, user_id: str):
     doc = await db["user"].find_one({"_id": oid(user_id)})
     if not doc:
         raise HTTPException(status_code=404, detail="User not found")
-    return User(**doc)
+    not_modified = check_not_modified(request, response, make_etag(user_id, doc.get("updated_at")), doc.get("updated_at"))
+    if not_modified:
+        return not_modified
+    return FastJSONResponse(render_model(User(**doc)), headers=page_headers(response))
 
 
 # Courses
 @app.post("/courses", response_model=Course)
 async def create_course(course: Course):
     # Ensure user exists
-    u = await db["user"].find_one({"_id": oid(course.user_id)})
-    if not u:
-        raise HTTPException(status_code=400, detail="User not found")
+    await ensure_exists("user", course.user_id, "User not found")
     data = course.model_dump()
     data["created_at"] = now_ts()
     data["updated_at"] = now_ts()
     doc = await create_document("course", data)
+    ref_cache.remember(("course", doc["_id"]), True)
     return Course(**doc)
 
 
 @app.get("/courses", response_model=List[Course])
-async def list_courses(user_id: str = Query(...)):
-    docs = await get_documents("course", {"user_id": user_id}, limit=200)
-    return [Course(**d) for d in docs]
+async def list_courses(
+    request: Request,
+    response: Response,
+    user_id: str = Query(...),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    fmt: str = Query("json", alias="format", pattern=LIST_FORMATS),
+):
+    projection = field_projection(Course, fields)
+    not_modified = await collection_not_modified(request, response, "course", {"user_id": user_id})
+    if not_modified:
+        return not_modified
+    if fmt != "json":
+        return stream_documents(fmt, None if projection else Course, "course", {"user_id": user_id}, COURSE_ORDER, limit, cursor, projection, page_headers(response))
+    docs = await paginate(response, "course", {"user_id": user_id}, COURSE_ORDER, min(limit or 200, 200), cursor, projection)
+    if projection:
+        return partial_response(response, docs)
+    return fast_list(response, Course, docs)
 
 
 # Tasks
-@app.post("/tasks", response_model=Task)
-async def create_task(task: Task):
-    # Validate references
-    u = await db["user"].find_one({"_id": oid(task.user_id)})
-    if not u:
-        raise HTTPException(status_code=400, detail="User not found")
-    if task.course_id:
-        c = await db["course"].find_one({"_id": oid(task.course_id)})
-        if not c:
-            raise HTTPException(status_code=400, detail="Course not found")
+def task_document(task: Task) -> dict:
     data = task.model_dump()
     data["status"] = data.get("status") or "pending"
     data["created_at"] = now_ts()
     data["updated_at"] = now_ts()
     if "xp_value" not in data or data["xp_value"] is None:
         data["xp_value"] = 10
-    doc = await create_document("task", data)
+    return data
+
+
+@app.post("/tasks", response_model=Task)
+async def create_task(task: Task):
+    # Validate references
+    await ensure_exists("user", task.user_id, "User not found")
+    if task.course_id:
+        await ensure_exists("course", task.course_id, "Course not found")
+    doc = await create_document("task", task_document(task))
+    invalidate_suggestion(task.user_id)
     return Task(**doc)
 
 
+class BulkTaskRequest(BaseModel):
+    tasks: List[Task] = Field(..., min_length=1, max_length=1000)
+
+
+class BulkItemError(BaseModel):
+    index: int
+    detail: str
+
+
+class BulkTaskResponse(BaseModel):
+    created: List[Task]
+    errors: List[BulkItemError]
+
+
+async def existing_ids(collection_name: str, ids: set) -> set:
+    """Which of the given ObjectIds exist in the collection; ids ref_cache can't answer take one $in query"""
+    known = {i: ref_cache.lookup((collection_name, str(i))) for i in ids}
+    unknown = [i for i, exists in known.items() if exists is None]
+    if unknown:
+        docs = await db[collection_name].find({"_id": {"$in": unknown}}, {"_id": 1}).to_list(length=None)
+        found = {d["_id"] for d in docs}
+        for i in unknown:
+            known[i] = i in found
+            ref_cache.remember((collection_name, str(i)), known[i])
+    return {i for i, exists in known.items() if exists}
+
+
+@app.post("/tasks/bulk", response_model=BulkTaskResponse)
+async def create_tasks_bulk(payload: BulkTaskRequest):
+    errors = {}
+    refs = {}
+    for i, task in enumerate(payload.tasks):
+        try:
+            refs[i] = (ObjectId(task.user_id), ObjectId(task.course_id) if task.course_id else None)
+        except (InvalidId, TypeError):
+            errors[i] = "Invalid id format"
+
+    # One $in lookup per referenced collection, however many tasks there are
+    users, courses = await asyncio.gather(
+        existing_ids("user", {user_id for user_id, _ in refs.values()}),
+        existing_ids("course", {course_id for _, course_id in refs.values() if course_id}),
+    )
+    for i, (user_id, course_id) in refs.items():
+        if user_id not in users:
+            errors[i] = "User not found"
+        elif course_id and course_id not in courses:
+            errors[i] = "Course not found"
+
+    positions = [i for i in range(len(payload.tasks)) if i not in errors]
+    docs, failed = await create_documents("task", [task_document(payload.tasks[i]) for i in positions], ordered=False)
+    for position, message in failed.items():
+        errors[positions[position]] = message
+
+    created = [Task(**doc) for doc in docs if doc is not None]
+    for user_id in {t.user_id for t in created}:
+        invalidate_suggestion(user_id)
+    return BulkTaskResponse(
+        created=created,
+        errors=[BulkItemError(index=i, detail=errors[i]) for i in sorted(errors)],
+    )
+
+
 @app.get("/tasks", response_model=List[Task])
-async def list_tasks(user_id: str = Query(...), course_id: Optional[str] = None, status: Optional[str] = None):
+async def list_tasks(
+    request: Request,
+    response: Response,
+    user_id: str = Query(...),
+    course_id: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    fmt: str = Query("json", alias="format", pattern=LIST_FORMATS),
+):
     q = {"user_id": user_id}
     if course_id:
         q["course_id"] = course_id
     if status:
         q["status"] = status
-    docs = await get_documents("task", q, limit=500)
-    return [Task(**d) for d in docs]
+    projection = field_projection(Task, fields)
+    # Versioned on all of the user's tasks, so filtered lists also change when a task leaves the filter
+    not_modified = await collection_not_modified(request, response, "task", {"user_id": user_id})
+    if not_modified:
+        return not_modified
+    if fmt != "json":
+        return stream_documents(fmt, None if projection else Task, "task", q, TASK_ORDER, limit, cursor, projection, page_headers(response))
+    docs = await paginate(response, "task", q, TASK_ORDER, min(limit or 500, 500), cursor, projection)
+    if projection:
+        return partial_response(response, docs)
+    return fast_list(response, Task, docs)
 
 
 class CompleteTaskResponse(BaseModel):
@@ -136,14 +609,51 @@ class CompleteTaskResponse(BaseModel):
     task: Task
 
 
+async def award_xp(user_id: str, xp_gain: int) -> Optional[dict]:
+    """Add XP and advance the daily streak in one atomic update, returning the updated user.
+
+    The streak rule runs server-side against the stored last_checkin: same day keeps it,
+    the previous day (or never) extends it, anything older restarts it at 1.
+    """
+    now = now_ts()
+    today_start = datetime(now.year, now.month, now.day)
+    yesterday_start = today_start - timedelta(days=1)
+    streak = {"$ifNull": ["$streak", 0]}
+    return await db["user"].find_one_and_update(
+        {"_id": oid(user_id)},
+        [{"$set": {
+            "xp": {"$add": [{"$ifNull": ["$xp", 0]}, xp_gain]},
+            "streak": {"$switch": {
+                "branches": [
+                    {"case": {"$gte": ["$last_checkin", today_start]}, "then": streak},
+                    {"case": {"$or": [
+                        {"$eq": [{"$ifNull": ["$last_checkin", None]}, None]},
+                        {"$gte": ["$last_checkin", yesterday_start]},
+                    ]}, "then": {"$add": [streak, 1]}},
+                ],
+                "default": 1,
+            }},
+            "last_checkin": now,
+            "updated_at": now,
+        }}],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
 @app.patch("/tasks/{task_id}/complete", response_model=CompleteTaskResponse)
 async def complete_task(task_id: str):
-    t = await db["task"].find_one({"_id": oid(task_id)})
+    # Only the request that flips the status awards XP, so parallel completions can't double-award
+    t = await db["task"].find_one_and_update(
+        {"_id": oid(task_id), "status": {"$ne": "completed"}},
+        {"$set": {"status": "completed", "updated_at": now_ts()}},
+        return_document=ReturnDocument.AFTER,
+    )
     if not t:
-        raise HTTPException(status_code=404, detail="Task not found")
-    if t.get("status") == "completed":
+        t = await db["task"].find_one({"_id": oid(task_id)})
+        if not t:
+            raise HTTPException(status_code=404, detail="Task not found")
         # idempotent
-        user = await db["user"].find_one({"_id": oid(t["user_id"])})
+        user = await db["user"].find_one({"_id": oid(t["user_id"])}, {"xp": 1, "streak": 1}) or {}
         return CompleteTaskResponse(
             xp_awarded=0,
             total_xp=user.get("xp", 0),
@@ -151,43 +661,82 @@ async def complete_task(task_id: str):
             task=Task(**t),
         )
 
-    # Mark complete
-    await db["task"].update_one({"_id": t["_id"]}, {"$set": {"status": "completed", "updated_at": now_ts()}})
+    xp_value = t.get("xp_value")
+    xp_gain = int(xp_value if xp_value is not None else 10)
+    user = await award_xp(t["user_id"], xp_gain)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Only once the award landed, so a missing user never shows up on the windowed boards
+    await record_xp(t["user_id"], {t.get("course_id"): xp_gain})
+    ranking.update(str(user["_id"]), user.get("xp", 0), user.get("name"), user.get("streak", 0))
+    invalidate_suggestion(t["user_id"])
 
-    # Award XP and update streak basics
-    xp_gain = int(t.get("xp_value", 10))
-    user = await db["user"].find_one({"_id": oid(t["user_id"])})
-    new_xp = int(user.get("xp", 0)) + xp_gain
+    return CompleteTaskResponse(
+        xp_awarded=xp_gain,
+        total_xp=user.get("xp", 0),
+        streak=user.get("streak", 0),
+        task=Task(**t),
+    )
 
-    # Simple daily streak: if last_checkin is today, keep, else if yesterday or None -> increment, else reset
-    today = date.today()
-    last = user.get("last_checkin")
-    if last and isinstance(last, datetime):
-        last_date = last.date()
-    else:
-        last_date = None
 
-    if last_date == today:
-        new_streak = int(user.get("streak", 0))
-    elif last_date == today - timedelta(days=1) or last_date is None:
-        new_streak = int(user.get("streak", 0)) + 1
-    else:
-        new_streak = 1
+class BulkCompleteRequest(BaseModel):
+    user_id: str
+    task_ids: List[str] = Field(..., min_length=1, max_length=1000)
+
 
-    await db["user"].update_one(
-        {"_id": user["_id"]},
-        {"$set": {"xp": new_xp, "streak": new_streak, "last_checkin": datetime.utcnow(), "updated_at": now_ts()}},
+class BulkCompleteResponse(BaseModel):
+    xp_awarded: int
+    total_xp: int
+    streak: int
+    completed: List[Task]
+    already_completed: List[str]
+    not_found: List[str]
+
+
+@app.patch("/tasks/complete", response_model=BulkCompleteResponse)
+async def complete_tasks_bulk(payload: BulkCompleteRequest):
+    task_ids = list(dict.fromkeys(oid(task_id) for task_id in payload.task_ids))
+    ts = now_ts()
+    # Tag the tasks this request flips so XP is only awarded for those, even under concurrent calls
+    claim = ObjectId()
+    await db["task"].bulk_write(
+        [
+            UpdateOne(
+                {"_id": task_id, "user_id": payload.user_id, "status": {"$ne": "completed"}},
+                {"$set": {"status": "completed", "completion_id": claim, "updated_at": ts}},
+            )
+            for task_id in task_ids
+        ],
+        ordered=False,
     )
+    found = await db["task"].find({"_id": {"$in": task_ids}, "user_id": payload.user_id}).to_list(length=None)
 
-    # Reload docs
-    t2 = await db["task"].find_one({"_id": oid(task_id)})
-    u2 = await db["user"].find_one({"_id": user["_id"]})
+    completed = [t for t in found if t.get("completion_id") == claim]
+    xp_by_course = {}
+    for t in completed:
+        xp_value = t.get("xp_value")
+        xp_by_course[t.get("course_id")] = xp_by_course.get(t.get("course_id"), 0) + int(xp_value if xp_value is not None else 10)
+    xp_gain = sum(xp_by_course.values())
 
-    return CompleteTaskResponse(
+    if completed:
+        # One XP award and streak step for the whole batch
+        user = await award_xp(payload.user_id, xp_gain)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        await record_xp(payload.user_id, xp_by_course)
+        ranking.update(str(user["_id"]), user.get("xp", 0), user.get("name"), user.get("streak", 0))
+        invalidate_suggestion(payload.user_id)
+    else:
+        user = await db["user"].find_one({"_id": oid(payload.user_id)}, {"xp": 1, "streak": 1}) or {}
+
+    found_ids = {t["_id"] for t in found}
+    return BulkCompleteResponse(
         xp_awarded=xp_gain,
-        total_xp=u2.get("xp", 0),
-        streak=u2.get("streak", 0),
-        task=Task(**t2),
+        total_xp=user.get("xp", 0),
+        streak=user.get("streak", 0),
+        completed=[Task(**t) for t in completed],
+        already_completed=[str(t["_id"]) for t in found if t.get("completion_id") != claim],
+        not_found=[str(task_id) for task_id in task_ids if task_id not in found_ids],
     )
 
 
@@ -201,22 +750,62 @@ class MoodRequest(BaseModel):
 @app.post("/moods", response_model=Mood)
 async def create_mood(payload: MoodRequest):
     # Validate user
-    u = await db["user"].find_one({"_id": oid(payload.user_id)})
-    if not u:
-        raise HTTPException(status_code=400, detail="User not found")
+    await ensure_exists("user", payload.user_id, "User not found")
     data = Mood(user_id=payload.user_id, mood=payload.mood, note=payload.note, created_at=now_ts()).model_dump()
     doc = await create_document("mood", data)
 
-    # Update last_checkin for streak continuity
-    today = date.today()
-    last = u.get("last_checkin")
-    if not last or (isinstance(last, datetime) and last.date() != today):
-        # Only set date if different to preserve increment logic on task completion
-        await db["user"].update_one({"_id": u["_id"]}, {"$set": {"last_checkin": datetime.utcnow(), "updated_at": now_ts()}})
+    # Keep the latest mood on the user so suggestions read it with the user document, and
+    # update last_checkin for streak continuity. Only set it if it isn't already today, to
+    # preserve increment logic on task completion; decided server-side so no user read is needed.
+    # Two check-ins racing can land out of order, so an older one never replaces a newer one.
+    today_start = datetime.combine(date.today(), datetime.min.time())
+    latest_mood = {"mood": doc["mood"], "note": doc.get("note"), "created_at": doc["created_at"]}
+    newer_stored = {"$gt": [{"$ifNull": ["$latest_mood.created_at", None]}, doc["created_at"]]}
+    await asyncio.gather(
+        db["user"].update_one({"_id": oid(payload.user_id)}, [{"$set": {
+            "latest_mood": {"$cond": [newer_stored, "$latest_mood", {"$literal": latest_mood}]},
+            "last_checkin": {"$cond": [{"$lt": ["$last_checkin", today_start]}, datetime.utcnow(), "$last_checkin"]},
+            "updated_at": now_ts(),
+        }}]),
+        record_mood(payload.user_id, doc["mood"], doc["created_at"]),
+    )
+    # Only now does the user document carry this mood; a suggestion cached earlier would miss it
+    invalidate_suggestion(payload.user_id)
 
     return Mood(**doc)
 
 
+async def record_mood(user_id: str, mood: str, ts: datetime):
+    """Count a check-in in the user's day and week mood rollups"""
+    # Mood names become field names under counts, so keep them free of path characters
+    key = mood.replace(".", "_").replace("$", "_") or "_"
+    ops = []
+    for granularity in WINDOWS:
+        period, start, _ = period_of(ts, granularity)
+        ops.append(UpdateOne(
+            {"user_id": user_id, "granularity": granularity, "period_start": start},
+            {"$inc": {f"counts.{key}": 1, "total": 1}, "$setOnInsert": {"period": period}},
+            upsert=True,
+        ))
+    await db["moodrollup"].bulk_write(ops, ordered=False)
+
+
+@app.get("/moods/summary", response_model=List[MoodRollup])
+async def mood_summary(
+    user_id: str = Query(...),
+    granularity: str = Query("day", pattern="^(day|week)$"),
+    periods: int = Query(30, ge=1, le=366),
+):
+    # The last `periods` days or weeks, oldest first, straight from the rollups
+    _, current_start, _ = period_of(now_ts(), granularity)
+    step = timedelta(days=1 if granularity == "day" else 7)
+    since = current_start - step * (periods - 1)
+    docs = await db["moodrollup"].find(
+        {"user_id": user_id, "granularity": granularity, "period_start": {"$gte": since}}
+    ).sort("period_start", 1).to_list(length=periods)
+    return [MoodRollup(**d) for d in docs]
+
+
 # Flamo Lite suggestions
 class SuggestionResponse(BaseModel):
     message: str
@@ -224,18 +813,30 @@ class SuggestionResponse(BaseModel):
 
 @app.get("/flamo/suggest", response_model=SuggestionResponse)
 async def suggest_next(user_id: str = Query(...)):
-    # Pull today's mood
-    today = date.today()
-    moods = await get_documents("mood", {"user_id": user_id}, limit=10)
-    today_mood = None
-    for m in moods:
-        ts = m.get("created_at")
-        if isinstance(ts, datetime) and ts.date() == today:
-            today_mood = m
-            break
-
-    # Get pending tasks sorted by due date
-    tasks = await db["task"].find({"user_id": user_id, "status": {"$ne": "completed"}}).sort("due_date", 1).to_list(length=50)
+    key = (user_id, date.today())
+    suggestion = suggestion_cache.get(key)
+    if suggestion is None:
+        suggestion = await build_suggestion(user_id, key[1])
+        suggestion_cache.set(key, suggestion)
+    return suggestion
+
+
+async def build_suggestion(user_id: str, today: date) -> SuggestionResponse:
+    # Today's mood is the user's latest mood if it was logged today; the user and the
+    # pending tasks (sorted by due date) are read concurrently
+    u, tasks = await asyncio.gather(
+        db["user"].find_one({"_id": oid(user_id)}, {"latest_mood": 1}),
+        db["task"].find(
+            {"user_id": user_id, "status": {"$ne": "completed"}}, {"title": 1, "due_date": 1}
+        ).sort("due_date", 1).to_list(length=1),
+    )
+    latest = (u or {}).get("latest_mood")
+    if latest is None:
+        # Users whose last check-in predates latest_mood: one indexed range read on mood
+        today_start = datetime.combine(today, datetime.min.time())
+        latest = await get_latest_document("mood", {"user_id": user_id}, since=today_start, until=today_start + timedelta(days=1))
+    ts = (latest or {}).get("created_at")
+    today_mood = latest if isinstance(ts, datetime) and ts.date() == today else None
 
     if not tasks:
         return SuggestionResponse(message="No pending tasks. Consider a 10-minute mindfulness break or review notes.")
@@ -263,21 +864,39 @@ async def suggest_next(user_id: str = Query(...)):
 @app.post("/posts", response_model=Post)
 async def create_post(post: Post):
     # Validate user
-    u = await db["user"].find_one({"_id": oid(post.user_id)})
-    if not u:
-        raise HTTPException(status_code=400, detail="User not found")
+    await ensure_exists("user", post.user_id, "User not found")
     data = post.model_dump()
     data["created_at"] = now_ts()
     data["updated_at"] = now_ts()
-    data["replies"] = []
+    data.pop("replies", None)
+    data["reply_count"] = 0
+    data["legacy_reply_count"] = 0
+    data["last_reply_at"] = None
+    data["last_reply_user_id"] = None
     doc = await create_document("post", data)
     return Post(**doc)
 
 
 @app.get("/posts", response_model=List[Post])
-async def list_posts(limit: int = 50):
-    docs = await db["post"].find({}).sort("created_at", -1).to_list(length=min(limit, 100))
-    return [Post(**d) for d in docs]
+async def list_posts(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    fmt: str = Query("json", alias="format", pattern=LIST_FORMATS),
+):
+    # Replies live in replybucket; the legacy embedded array is never listed
+    projection = field_projection(Post, fields, hidden=("replies",))
+    not_modified = await collection_not_modified(request, response, "post", {})
+    if not_modified:
+        return not_modified
+    if fmt != "json":
+        return stream_documents(fmt, None if projection else Post, "post", {}, POST_ORDER, limit, cursor, projection or {"replies": 0}, page_headers(response))
+    docs = await paginate(response, "post", {}, POST_ORDER, max(1, min(limit or 50, 100)), cursor, projection or {"replies": 0})
+    if projection:
+        return partial_response(response, docs)
+    return fast_list(response, Post, docs)
 
 
 class ReplyRequest(BaseModel):
@@ -288,20 +907,73 @@ class ReplyRequest(BaseModel):
 @app.post("/posts/{post_id}/reply", response_model=Post)
 async def add_reply(post_id: str, reply: ReplyRequest):
     # Validate user
-    u = await db["user"].find_one({"_id": oid(reply.user_id)})
-    if not u:
-        raise HTTPException(status_code=400, detail="User not found")
-    rep = Reply(user_id=reply.user_id, content=reply.content, created_at=now_ts()).model_dump()
+    await ensure_exists("user", reply.user_id, "User not found")
+    ts = now_ts()
+    rep = Reply(user_id=reply.user_id, content=reply.content, created_at=ts).model_dump()
+    # Reserve the reply's sequence number and refresh the post's reply summary. The first
+    # bucketed reply on a post from before bucketing also counts its embedded replies in.
+    unseeded = {"$eq": [{"$ifNull": ["$legacy_reply_count", None]}, None]}
     res = await db["post"].find_one_and_update(
         {"_id": oid(post_id)},
-        {"$push": {"replies": rep}, "$set": {"updated_at": now_ts()}},
-        return_document=True,
+        [{"$set": {
+            "legacy_reply_count": {"$ifNull": ["$legacy_reply_count", LEGACY_REPLY_COUNT]},
+            "reply_count": {"$add": [{"$ifNull": ["$reply_count", 0]}, {"$cond": [unseeded, LEGACY_REPLY_COUNT, 0]}, 1]},
+            "last_reply_at": ts,
+            "last_reply_user_id": {"$literal": reply.user_id},
+            "updated_at": ts,
+        }}],
+        projection={"replies": 0},
+        return_document=ReturnDocument.AFTER,
     )
     if not res:
         raise HTTPException(status_code=404, detail="Post not found")
+    sequence = res["reply_count"] - 1 - res["legacy_reply_count"]
+    await db["replybucket"].update_one(
+        {"post_id": str(res["_id"]), "bucket": sequence // REPLY_BUCKET_SIZE},
+        {"$push": {"replies": rep}, "$inc": {"count": 1}, "$setOnInsert": {"created_at": ts}},
+        upsert=True,
+    )
     return Post(**res)
 
 
+@app.get("/posts/{post_id}/replies", response_model=List[Reply])
+async def list_replies(response: Response, post_id: str, cursor: Optional[str] = None):
+    # Oldest first, REPLY_BUCKET_SIZE per page: replies still embedded in the post from before
+    # bucketing come first, then one page per bucket
+    page = 0
+    if cursor:
+        try:
+            page = decode_cursor(cursor)[0]
+        except (ValueError, IndexError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # Our cursors only ever hold the page number; bool is an int too, so rule it out
+        if not isinstance(page, int) or isinstance(page, bool) or page < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    posts = await db["post"].aggregate([
+        {"$match": {"_id": oid(post_id)}},
+        {"$project": {"reply_count": 1, "legacy_reply_count": 1, "embedded": LEGACY_REPLY_COUNT}},
+    ]).to_list(length=1)
+    if not posts:
+        raise HTTPException(status_code=404, detail="Post not found")
+    post = posts[0]
+    legacy = post.get("embedded", 0)
+    # reply_count includes the embedded replies once the post has been seeded
+    bucketed = post.get("reply_count", 0) - (legacy if "legacy_reply_count" in post else 0)
+    legacy_pages = -(-legacy // REPLY_BUCKET_SIZE)
+    # The post's counter, not a bucket's own count, says whether more pages exist, so a bucket
+    # left short by a failed push doesn't hide the ones after it
+    if page + 1 < legacy_pages + -(-bucketed // REPLY_BUCKET_SIZE):
+        response.headers["X-Next-Cursor"] = encode_cursor([page + 1])
+
+    if page < legacy_pages:
+        doc = await db["post"].find_one(
+            {"_id": post["_id"]}, {"_id": 1, "replies": {"$slice": [page * REPLY_BUCKET_SIZE, REPLY_BUCKET_SIZE]}}
+        )
+        return [Reply(**r) for r in (doc or {}).get("replies", [])]
+    doc = await db["replybucket"].find_one({"post_id": str(post["_id"]), "bucket": page - legacy_pages})
+    return [Reply(**r) for r in (doc or {}).get("replies", [])]
+
+
 # Leaderboard
 class Leader(BaseModel):
     user_id: str
@@ -310,7 +982,192 @@ class Leader(BaseModel):
     streak: int
 
 
+def leader_from_doc(u: dict) -> Leader:
+    return Leader(user_id=str(u.get("_id")), name=u.get("name"), xp=int(u.get("xp", 0)), streak=int(u.get("streak", 0)))
+
+
+async def windowed_leaders(response: Response, window: str, course_id: Optional[str], limit: int, cursor: Optional[str]) -> List[Leader]:
+    period = period_of(now_ts(), window)[0]
+    q = {"window": window, "period": period, "course_id": course_id}
+    buckets = await paginate(response, "xpbucket", q, XP_BUCKET_ORDER, limit, cursor, {"user_id": 1, "xp": 1})
+
+    # Names and streaks come from the in-memory board, with one $in read for anyone it lacks
+    users = {b["user_id"]: ranking.get(b["user_id"]) for b in buckets}
+    missing = [oid(uid) for uid, entry in users.items() if entry is None]
+    if missing:
+        async for u in db["user"].find({"_id": {"$in": missing}}, LEADER_FIELDS):
+            users[str(u["_id"])] = {"name": u.get("name"), "streak": u.get("streak", 0)}
+    leaders = []
+    for b in buckets:
+        u = users.get(b["user_id"]) or {}
+        leaders.append(Leader(user_id=b["user_id"], name=u.get("name") or "", xp=int(b.get("xp", 0)), streak=int(u.get("streak") or 0)))
+    return leaders
+
+
 @app.get("/leaderboard", response_model=List[Leader])
-async def leaderboard(limit: int = 10):
-    users = await db["user"].find({}).sort("xp", -1).to_list(length=min(limit, 50))
-    return [Leader(user_id=str(u.get("_id")), name=u.get("name"), xp=int(u.get("xp", 0)), streak=int(u.get("streak", 0))) for u in users]
+async def leaderboard(
+    request: Request,
+    response: Response,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    window: Optional[str] = Query(None, pattern="^(day|week)$"),
+    course_id: Optional[str] = None,
+):
+    limit = max(1, min(limit, 50))
+    if window:
+        return fast_list(response, Leader, await windowed_leaders(response, window, course_id, limit, cursor))
+    if course_id:
+        raise HTTPException(status_code=400, detail="course_id requires window")
+    if not ranking.ready:
+        users = await paginate(response, "user", {}, LEADERBOARD_ORDER, limit, cursor, LEADER_FIELDS)
+        return fast_list(response, Leader, [leader_from_doc(u) for u in users])
+
+    # The board's version changes with every award or reload in this process
+    etag = make_etag(PROCESS_ETAG_SALT, ranking.version, limit, cursor)
+    not_modified = check_not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+    start = 0
+    if cursor:
+        try:
+            xp, user_id = decode_cursor(cursor)
+            start = ranking.position_after(int(xp), str(user_id))
+        except (ValueError, TypeError, OverflowError):  # int() of a crafted Infinity raises OverflowError
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    rows = ranking.page(start, limit + 1)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        # Same (xp, _id) cursor shape as the Mongo path, so either can continue the other's pages
+        response.headers["X-Next-Cursor"] = encode_cursor([rows[-1]["xp"], ObjectId(rows[-1]["user_id"])])
+    return fast_list(response, Leader, rows)
+
+
+class LeaderRank(BaseModel):
+    rank: int
+    user: Leader
+    above: List[Leader]
+    below: List[Leader]
+
+
+@app.get("/leaderboard/rank/{user_id}", response_model=LeaderRank)
+async def leaderboard_rank(user_id: str, k: int = Query(5, ge=0, le=50)):
+    u = await db["user"].find_one({"_id": oid(user_id)}, LEADER_FIELDS)
+    if not u:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if ranking.ready:
+        # Key on the stored id: the path may spell the same ObjectId in upper case
+        key = str(u["_id"])
+        if ranking.get(key) is None:
+            # Not seen by this worker yet (e.g. created by another one)
+            ranking.update(key, u.get("xp", 0), u.get("name"), u.get("streak", 0))
+        rank = ranking.rank(key)
+        first_above = max(0, rank - 1 - k)
+        return LeaderRank(
+            rank=rank,
+            user=Leader(**ranking.get(key)),
+            above=[Leader(**r) for r in ranking.page(first_above, rank - 1 - first_above)],
+            below=[Leader(**r) for r in ranking.page(rank, k)],
+        )
+
+    # Board not loaded: answer from the (xp desc, _id) index instead
+    position = [u.get("xp", 0), u["_id"]]
+    reverse_order = [(field, -direction) for field, direction in LEADERBOARD_ORDER]
+    ahead = keyset_filter(reverse_order, position)
+    above, below = [], []
+    if k:
+        above = await db["user"].find(ahead, LEADER_FIELDS).sort(reverse_order).to_list(length=k)
+        below = await db["user"].find(keyset_filter(LEADERBOARD_ORDER, position), LEADER_FIELDS).sort(LEADERBOARD_ORDER).to_list(length=k)
+    return LeaderRank(
+        rank=await db["user"].count_documents(ahead) + 1,
+        user=leader_from_doc(u),
+        above=[leader_from_doc(a) for a in reversed(above)],
+        below=[leader_from_doc(b) for b in below],
+    )
+
+
+# Delta sync
+# What /sync pulls: the field each collection's changes are ordered by, and whether it is
+# scoped to the user. Moods are append-only, so their creation time is their change time;
+# posts are one shared feed.
+SYNC_SOURCES = [
+    ("task", Task, "updated_at", True),
+    ("course", Course, "updated_at", True),
+    ("mood", Mood, "created_at", True),
+    ("post", Post, "updated_at", False),
+]
+# Posts from before reply buckets still embed their replies; sync leaves those to /posts/{id}/replies
+SYNC_PROJECTIONS = {"post": {"replies": 0}}
+# Only changes at least this old are handed out, so a write still in flight with an earlier
+# timestamp can't land behind a token that has already moved past it
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "2"))
+
+
+class SyncResponse(BaseModel):
+    tasks: List[Task]
+    courses: List[Course]
+    moods: List[Mood]
+    posts: List[Post]
+    deleted: Dict[str, List[str]]
+    token: str
+    has_more: bool
+
+
+@app.get("/sync", response_model=SyncResponse)
+async def sync(
+    user_id: str = Query(...),
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000),
+):
+    """Everything that changed since `since` (all current documents without it), plus a token for next time.
+
+    Each collection (and the tombstones) advances its own keyset mark over an (updated_at, _id)
+    index, so a pull costs what changed rather than what exists. `limit` applies per collection;
+    when any of them is cut short `has_more` is set and the returned token continues from there.
+    """
+    horizon = now_ts() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    if since:
+        try:
+            marks = decode_cursor(since)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid sync token")
+        if (
+            len(marks) != len(SYNC_SOURCES) + 1
+            or not all(m is None or (isinstance(m, list) and len(m) == 2) for m in marks)
+            or not (marks[-1] and isinstance(marks[-1][0], datetime))
+        ):
+            raise HTTPException(status_code=400, detail="Invalid sync token")
+        if marks[-1][0] < horizon - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+            raise HTTPException(status_code=410, detail="Sync token expired; sync again without `since`")
+    else:
+        # A first pull returns every live document, so only deletes from here on matter
+        marks = [None] * len(SYNC_SOURCES) + [[horizon, None]]
+
+    pulls = [
+        find_changes(name, {"user_id": user_id} if per_user else {}, field, mark, horizon, limit, SYNC_PROJECTIONS.get(name))
+        for (name, _, field, per_user), mark in zip(SYNC_SOURCES, marks)
+    ]
+    pulls.append(find_changes("tombstone", {"user_id": user_id}, "deleted_at", marks[-1], horizon, limit))
+    try:
+        results = await asyncio.gather(*pulls)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+    changed = {name: [model(**d) for d in docs] for (name, model, _, _), (docs, _, _) in zip(SYNC_SOURCES, results)}
+    deleted = {name: [] for name, _, _, _ in SYNC_SOURCES}
+    tombstones, buried_mark, buried_more = results[-1]
+    for t in tombstones:
+        deleted.setdefault(t["collection"], []).append(t["doc_id"])
+    if not buried_more:
+        # Every delete up to the horizon has been seen; moving the mark there keeps a quiet
+        # client's token from ageing past the tombstone retention
+        results[-1] = (tombstones, [horizon, None], False)
+    return SyncResponse(
+        tasks=changed["task"],
+        courses=changed["course"],
+        moods=changed["mood"],
+        posts=changed["post"],
+        deleted=deleted,
+        token=encode_cursor([mark for _, mark, _ in results]),
+        has_more=any(more for _, _, more in results),
+    )
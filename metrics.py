@@ -0,0 +1,248 @@
+"""
+Prometheus metrics
+
+A small in-process registry of counters, gauges and histograms rendered in the Prometheus
+text exposition format by GET /metrics. Each uvicorn worker keeps its own numbers; scrape
+every worker (or run one) to see them all.
+
+Requests are labelled with the route template that matched ("/tasks/{task_id}/complete"),
+never the raw path, so label cardinality stays bounded by the number of endpoints. Metrics
+are updated from the event loop and from the driver's monitoring threads, hence the locks.
+"""
+
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+
+from starlette.routing import Match
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; request latencies and the much shorter individual database operations
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{%s}" % ",".join(parts) if parts else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+
+    def _header(self) -> list:
+        return ["# HELP %s %s" % (self.name, self.documentation), "# TYPE %s %s" % (self.name, self.kind)]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [
+            "%s%s %s" % (self.name, _labels(self.labelnames, labels), _number(value)) for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            i = 0
+            while i < len(self.buckets) and value > self.buckets[i]:
+                i += 1
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._values.items())
+        lines = self._header()
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append("%s_bucket%s %d" % (self.name, _labels(self.labelnames, labels, 'le="%s"' % le), cumulative))
+            lines.append("%s_sum%s %s" % (self.name, _labels(self.labelnames, labels), repr(total)))
+            lines.append("%s_count%s %d" % (self.name, _labels(self.labelnames, labels), count))
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests handled, by route template and status code", ("method", "route", "status")
+)
+http_errors = registry.counter(
+    "http_request_errors_total", "HTTP requests that raised or answered with a 5xx status", ("method", "route")
+)
+http_latency = registry.histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending the last body byte", ("method", "route")
+)
+http_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requests currently being handled", ("method", "route")
+)
+db_latency = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command round-trip time, by collection and command",
+    ("collection", "command"), buckets=DB_BUCKETS,
+)
+db_failures = registry.counter(
+    "mongo_command_failures_total", "MongoDB commands that returned an error", ("collection", "command")
+)
+db_documents = registry.counter(
+    "mongo_command_documents_total", "Documents returned or written by MongoDB commands", ("collection", "command")
+)
+
+# Id of the HTTP request being handled; motor copies the context into its worker threads,
+# so driver monitoring callbacks can attribute commands to the request that issued them
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+REQUEST_ID_HEADER = "X-Request-ID"
+
+UNMATCHED_ROUTE = "<unmatched>"
+# Clients can send any method token; everything else shares one label
+KNOWN_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "CONNECT", "TRACE"})
+OTHER_METHOD = "other"
+
+
+def route_template(routes, scope) -> str:
+    """The path template of the route that will handle `scope`"""
+    partial = None
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+        if match == Match.PARTIAL and partial is None:
+            partial = getattr(route, "path", UNMATCHED_ROUTE)
+    return partial or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Counts, times and tracks in-flight HTTP requests per route template"""
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"] if scope["method"] in KNOWN_METHODS else OTHER_METHOD
+        route = route_template(self.routes, scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc(method, route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            http_in_flight.dec(method, route)
+            http_latency.observe(time.perf_counter() - start, method, route)
+            http_requests.inc(method, route, str(status))
+            if status >= 500:
+                http_errors.inc(method, route)
+
+
+class RequestIdMiddleware:
+    """Takes the caller's X-Request-ID (or makes one up), exposes it to the data layer and echoes it back"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                rid = value.decode("latin-1")[:128]
+                break
+        rid = rid or uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", rid.encode("latin-1"))]
+            await send(message)
+
+        token = request_id.set(rid)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,141 @@
+"""
+One-off data migrations
+
+Run from the repository root, with the same DATABASE_URL / DATABASE_NAME as the API:
+
+    python migrations.py                  # every step, in order
+    python migrations.py reply_counts     # just the named step(s)
+
+Every step is idempotent, so re-running one (or all) is safe.
+"""
+
+import asyncio
+import logging
+import sys
+
+from database import db, connect_db, close_db, ensure_collections, ensure_indexes
+from schemas import Mood, MoodRollup, LEGACY_REPLY_COUNT
+
+logger = logging.getLogger(__name__)
+
+COPY_BATCH = 1000
+
+
+async def reply_counts():
+    """Count replies embedded in posts from before reply buckets into reply_count"""
+    res = await db["post"].update_many(
+        {"legacy_reply_count": {"$exists": False}},
+        [{"$set": {
+            "legacy_reply_count": LEGACY_REPLY_COUNT,
+            "reply_count": {"$add": [{"$ifNull": ["$reply_count", 0]}, LEGACY_REPLY_COUNT]},
+        }}],
+    )
+    logger.info("reply_counts: seeded %d posts", res.modified_count)
+
+
+async def mood_timeseries():
+    """Move moods out of a regular `mood` collection into the time-series one Mood declares.
+
+    Time-series collections can't be renamed into place, so the regular collection is renamed
+    to mood_legacy first and copied across in _id order. Stop the API while this runs: a
+    check-in in between would recreate `mood` as a regular collection. An interrupted copy
+    resumes after the last _id copied; mood_legacy is left for you to drop afterwards.
+    """
+    names = {info["name"]: info.get("type") async for info in db.list_collections(filter={"name": {"$in": ["mood", "mood_legacy"]}})}
+    if names.get("mood") not in (None, "timeseries"):
+        if "mood_legacy" in names:
+            raise RuntimeError("Both mood and mood_legacy are regular collections; resolve that by hand first")
+        await db["mood"].rename("mood_legacy")
+        names = {"mood_legacy": "collection"}
+    if "mood_legacy" not in names:
+        logger.info("mood_timeseries: nothing to migrate")
+        return
+    await ensure_collections([Mood])
+
+    last = await db["mood"].find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    query = {"_id": {"$gt": last["_id"]}} if last else {}
+    copied, batch = 0, []
+    async for doc in db["mood_legacy"].find(query).sort("_id", 1):
+        if doc.get("created_at") is None:
+            # A time-series measurement needs its time field; fall back to the id's timestamp
+            doc["created_at"] = doc["_id"].generation_time.replace(tzinfo=None)
+        batch.append(doc)
+        if len(batch) >= COPY_BATCH:
+            await db["mood"].insert_many(batch, ordered=True)
+            copied, batch = copied + len(batch), []
+    if batch:
+        await db["mood"].insert_many(batch, ordered=True)
+        copied += len(batch)
+    await ensure_indexes([Mood])
+    logger.info("mood_timeseries: copied %d moods; drop mood_legacy once satisfied", copied)
+
+
+def _rollup_pipeline(granularity: str) -> list:
+    # Same periods and count keys as main.period_of / main.record_mood
+    if granularity == "day":
+        start = {"$dateTrunc": {"date": "$created_at", "unit": "day"}}
+        period = {"$dateToString": {"date": "$created_at", "format": "%Y-%m-%d"}}
+    else:
+        start = {"$dateTrunc": {"date": "$created_at", "unit": "week", "startOfWeek": "monday"}}
+        period = {"$dateToString": {"date": "$created_at", "format": "%G-W%V"}}
+    key = {"$replaceAll": {"input": {"$replaceAll": {"input": "$mood", "find": ".", "replacement": "_"}}, "find": {"$literal": "$"}, "replacement": "_"}}
+    return [
+        {"$match": {"created_at": {"$ne": None}}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "period_start": start, "period": period, "key": {"$cond": [{"$eq": [key, ""]}, "_", key]}},
+            "n": {"$sum": 1},
+        }},
+        {"$group": {
+            "_id": {"user_id": "$_id.user_id", "period_start": "$_id.period_start", "period": "$_id.period"},
+            "counts": {"$push": {"k": "$_id.key", "v": "$n"}},
+            "total": {"$sum": "$n"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id.user_id",
+            "granularity": {"$literal": granularity},
+            "period_start": "$_id.period_start",
+            "period": "$_id.period",
+            "counts": {"$arrayToObject": "$counts"},
+            "total": 1,
+        }},
+        {"$merge": {"into": "moodrollup", "on": ["user_id", "granularity", "period_start"], "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+async def mood_rollups():
+    """Rebuild every day and week mood rollup from the mood check-ins.
+
+    Rollups only count check-ins made since they were introduced; this recomputes them from
+    all of history. Run it with check-ins paused, as a check-in counted in between is
+    overwritten by the rebuilt total.
+    """
+    await ensure_indexes([MoodRollup])  # $merge needs the unique (user_id, granularity, period_start) index
+    for granularity in ("day", "week"):
+        await db["mood"].aggregate(_rollup_pipeline(granularity), allowDiskUse=True).to_list(length=None)
+    logger.info("mood_rollups: rebuilt %d rollups", await db["moodrollup"].count_documents({}))
+
+
+STEPS = {
+    "reply_counts": reply_counts,
+    "mood_timeseries": mood_timeseries,
+    "mood_rollups": mood_rollups,
+}
+
+
+async def run(names):
+    await connect_db()
+    try:
+        for name in names:
+            await STEPS[name]()
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    requested = sys.argv[1:] or list(STEPS)
+    unknown = [name for name in requested if name not in STEPS]
+    if unknown:
+        sys.exit("Unknown migration(s): %s (available: %s)" % (", ".join(unknown), ", ".join(STEPS)))
+    asyncio.run(run(requested))
@@ -1,26 +1,46 @@
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, Field, EmailStr
+from typing import Annotated, ClassVar, Dict, Optional, List
+from pydantic import BaseModel, BeforeValidator, Field, EmailStr
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+# Each model corresponds to a MongoDB collection named by the class name lowercased.
+# __indexes__ lists the indexes that collection needs and __timeseries__ (if set) the
+# time-series options it is created with; both are applied at startup.
+
+# MongoDB hands back ObjectId values for _id; expose them as plain strings
+ObjectIdStr = Annotated[str, BeforeValidator(lambda v: str(v) if v is not None else v)]
+
+
+class LatestMood(BaseModel):
+    """Copy of a user's most recent mood check-in, kept on the user document"""
+    mood: str
+    note: Optional[str] = None
+    created_at: datetime
 
-# Each model corresponds to a MongoDB collection named by the class name lowercased
 
 class User(BaseModel):
-    id: Optional[str] = Field(default=None, alias="_id")
+    id: Optional[ObjectIdStr] = Field(default=None, alias="_id")
     email: EmailStr
     name: str
     xp: int = 0
     streak: int = 0
     last_checkin: Optional[datetime] = None
+    latest_mood: Optional[LatestMood] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+    __indexes__: ClassVar[List[IndexModel]] = [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("xp", DESCENDING), ("_id", ASCENDING)]),
+    ]
+
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
 
 
 class Course(BaseModel):
-    id: Optional[str] = Field(default=None, alias="_id")
+    id: Optional[ObjectIdStr] = Field(default=None, alias="_id")
     user_id: str
     title: str
     code: Optional[str] = None
@@ -28,12 +48,17 @@ class Course(BaseModel):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+    __indexes__: ClassVar[List[IndexModel]] = [
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+    ]
+
     class Config:
         populate_by_name = True
 
 
 class Task(BaseModel):
-    id: Optional[str] = Field(default=None, alias="_id")
+    id: Optional[ObjectIdStr] = Field(default=None, alias="_id")
     user_id: str
     title: str
     course_id: Optional[str] = None
@@ -43,17 +68,68 @@ class Task(BaseModel):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+    __indexes__: ClassVar[List[IndexModel]] = [
+        IndexModel([("user_id", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("course_id", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+    ]
+
+    class Config:
+        populate_by_name = True
+
+
+class XpBucket(BaseModel):
+    """XP a user earned in one day or ISO week, overall (course_id None) or within one course"""
+    id: Optional[ObjectIdStr] = Field(default=None, alias="_id")
+    user_id: str
+    window: str  # day | week
+    period: str  # 2024-05-17 | 2024-W20
+    course_id: Optional[str] = None
+    xp: int = 0
+    expires_at: Optional[datetime] = None
+
+    __indexes__: ClassVar[List[IndexModel]] = [
+        IndexModel([("window", ASCENDING), ("period", ASCENDING), ("course_id", ASCENDING), ("user_id", ASCENDING)], unique=True),
+        IndexModel([("window", ASCENDING), ("period", ASCENDING), ("course_id", ASCENDING), ("xp", DESCENDING), ("user_id", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ]
+
     class Config:
         populate_by_name = True
 
 
 class Mood(BaseModel):
-    id: Optional[str] = Field(default=None, alias="_id")
+    id: Optional[ObjectIdStr] = Field(default=None, alias="_id")
     user_id: str
     mood: str  # happy, neutral, tired, stressed, motivated
     note: Optional[str] = None
     created_at: Optional[datetime] = None
 
+    __timeseries__: ClassVar[dict] = {"timeField": "created_at", "metaField": "user_id", "granularity": "hours"}
+    __indexes__: ClassVar[List[IndexModel]] = [
+        # Serves /sync's (created_at, _id) keyset order, and newest-first reads when walked backwards
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+    ]
+
+    class Config:
+        populate_by_name = True
+
+
+class MoodRollup(BaseModel):
+    """Mood check-in counts for one user over one day or ISO week"""
+    id: Optional[ObjectIdStr] = Field(default=None, alias="_id")
+    user_id: str
+    granularity: str  # day | week
+    period: str  # 2024-05-17 | 2024-W20
+    period_start: datetime
+    counts: Dict[str, int] = {}
+    total: int = 0
+
+    __indexes__: ClassVar[List[IndexModel]] = [
+        IndexModel([("user_id", ASCENDING), ("granularity", ASCENDING), ("period_start", ASCENDING)], unique=True),
+    ]
+
     class Config:
         populate_by_name = True
 
@@ -65,13 +141,60 @@ class Reply(BaseModel):
 
 
 class Post(BaseModel):
-    id: Optional[str] = Field(default=None, alias="_id")
+    id: Optional[ObjectIdStr] = Field(default=None, alias="_id")
     user_id: str
     title: str
     content: str
-    replies: List[Reply] = []
+    replies: List[Reply] = []  # legacy embedded replies; new replies are stored in ReplyBucket
+    reply_count: int = 0
+    last_reply_at: Optional[datetime] = None
+    last_reply_user_id: Optional[str] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+    __indexes__: ClassVar[List[IndexModel]] = [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("updated_at", DESCENDING), ("_id", DESCENDING)]),
+    ]
+
+    class Config:
+        populate_by_name = True
+
+
+# Replies still embedded in a post from before ReplyBucket (aggregation expression)
+LEGACY_REPLY_COUNT = {"$size": {"$ifNull": ["$replies", []]}}
+
+
+class ReplyBucket(BaseModel):
+    """A fixed-size chunk of a post's replies; reply number n lives in bucket n // bucket size"""
+    id: Optional[ObjectIdStr] = Field(default=None, alias="_id")
+    post_id: str
+    bucket: int
+    count: int = 0
+    replies: List[Reply] = []
+    created_at: Optional[datetime] = None
+
+    __indexes__: ClassVar[List[IndexModel]] = [
+        IndexModel([("post_id", ASCENDING), ("bucket", ASCENDING)], unique=True),
+    ]
+
+    class Config:
+        populate_by_name = True
+
+
+class Tombstone(BaseModel):
+    """Record of a deleted document, kept so /sync can tell clients to drop their copy"""
+    id: Optional[ObjectIdStr] = Field(default=None, alias="_id")
+    collection: str
+    doc_id: str
+    user_id: str
+    deleted_at: datetime
+    expires_at: Optional[datetime] = None
+
+    __indexes__: ClassVar[List[IndexModel]] = [
+        IndexModel([("user_id", ASCENDING), ("deleted_at", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ]
+
     class Config:
         populate_by_name = True
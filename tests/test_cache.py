@@ -0,0 +1,59 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+from cache import ExistenceCache, TTLCache  # noqa: E402
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_evicts_and_counts(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    c = TTLCache(maxsize=2, ttl=10.0)
+
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # "a" is now the most recently used
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+
+    clock.now += 10.0
+    assert c.get("a", "gone") == "gone"
+    assert len(c) == 1
+
+    c.invalidate("c")
+    c.invalidate("c")
+    assert len(c) == 0
+    stats = c.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["invalidations"]) == (3, 2, 1, 1)
+
+
+def test_existence_cache_remembers_both_answers(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    c = ExistenceCache(maxsize=10, ttl=300.0, negative_ttl=5.0)
+
+    assert c.lookup("u1") is None
+    c.remember("u1", False)
+    assert c.lookup("u1") is False
+    clock.now += 5.0
+    assert c.lookup("u1") is None  # a miss is only trusted briefly
+
+    c.remember("u1", False)
+    c.remember("u1", True)  # created since: the negative entry must not shadow it
+    assert c.lookup("u1") is True
+    clock.now += 299.0
+    assert c.lookup("u1") is True
+
+    c.forget("u1")
+    assert c.lookup("u1") is None
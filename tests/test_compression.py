@@ -0,0 +1,43 @@
+import gzip
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import compression  # noqa: E402
+from compression import choose_encoding, compress  # noqa: E402
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("GZIP;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "gzip"),
+    ("*, gzip;q=0", None),
+    ("br", None),
+    ("deflate, gzip;q=bogus", None),
+])
+def test_choose_encoding_without_brotli(monkeypatch, header, expected):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding(header) == expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("br, gzip", "br"),
+    ("gzip, br;q=0.5", "gzip"),
+    ("br;q=0.8, gzip;q=0.8", "br"),
+    ("*", "br"),
+    ("*;q=0.5, br;q=0", "gzip"),
+])
+def test_choose_encoding_prefers_brotli_when_available(monkeypatch, header, expected):
+    monkeypatch.setattr(compression, "brotli", object())
+    assert choose_encoding(header) == expected
+
+
+def test_gzip_round_trip():
+    body = b'{"xp": 1}' * 200
+    assert gzip.decompress(compress(body, "gzip")) == body
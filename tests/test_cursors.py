@@ -0,0 +1,143 @@
+import base64
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId, json_util  # noqa: E402
+
+from database import decode_cursor, encode_cursor, keyset_filter, query_shape  # noqa: E402
+
+
+def _token(values) -> str:
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    """Just enough of MongoDB's matching for the filters keyset_filter builds"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(doc, clause) for clause in condition):
+                return False
+            continue
+        value = doc.get(key)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for op, operand in condition.items():
+            if op == "$exists":
+                ok = (key in doc) == operand
+            elif op == "$ne":
+                ok = value != operand
+            elif value is None or operand is None:
+                ok = False  # comparisons never match across null and a number
+            else:
+                ok = value > operand if op == "$gt" else value < operand
+            if not ok:
+                return False
+    return True
+
+
+def _sort_key(sort):
+    # Null sorts before every number: first ascending, last descending
+    def key(doc):
+        parts = []
+        for field, direction in sort:
+            value = doc.get(field)
+            if direction == 1:
+                parts.append((value is not None, value or 0))
+            else:
+                parts.append((value is None, -(value or 0)))
+        return parts
+    return key
+
+
+def test_round_trip_keeps_cursor_values():
+    values = [datetime(2024, 5, 1, 12, 30, 15, 123000), ObjectId(), None, 7, 2.5, "b", True]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+@pytest.mark.parametrize("values", [
+    [{"$gt": ""}],
+    [{"$ne": None}, ObjectId()],
+    [[{"$where": "sleep(1000)"}]],
+    {"xp": 1},
+    5,
+])
+def test_crafted_tokens_are_rejected(values):
+    with pytest.raises(ValueError):
+        decode_cursor(_token(values))
+
+
+def test_garbage_tokens_are_rejected():
+    for token in ["", "!!!", base64.urlsafe_b64encode(b"not json").decode()]:
+        with pytest.raises(ValueError):
+            decode_cursor(token)
+
+
+def test_keyset_filter_rejects_operators_and_wrong_lengths():
+    sort = [("xp", -1), ("_id", 1)]
+    with pytest.raises(ValueError):
+        keyset_filter(sort, [{"$gt": 0}, ObjectId()])
+    with pytest.raises(ValueError):
+        keyset_filter(sort, [5])
+
+
+def test_null_sort_values():
+    oid = ObjectId()
+    # Ascending: nulls come first, so after a null only the non-null values remain
+    assert keyset_filter([("due", 1), ("_id", 1)], [None, oid]) == {"$or": [
+        {"due": {"$ne": None}},
+        {"due": None, "_id": {"$gt": oid}},
+    ]}
+    # Descending: nulls come last, so a non-null value is still followed by them
+    assert keyset_filter([("due", -1), ("_id", -1)], [3, oid]) == {"$or": [
+        {"$or": [{"due": {"$lt": 3}}, {"due": None}]},
+        {"due": 3, "_id": {"$lt": oid}},
+    ]}
+    # ... while after a null nothing but later nulls can follow
+    assert keyset_filter([("due", -1), ("_id", -1)], [None, oid]) == {"$or": [
+        {"due": None, "_id": {"$lt": oid}},
+    ]}
+
+
+@pytest.mark.parametrize("sort", [
+    [("due", 1), ("_id", 1)],
+    [("due", -1), ("_id", -1)],
+    [("due", -1), ("_id", 1)],
+])
+def test_paging_visits_every_document_once(sort):
+    docs = [{"_id": i, "due": [None, 1, 2, 2, 3][i % 5]} for i in range(23)]
+    docs.append({"_id": 23})  # the field missing altogether sorts like null
+    expected = sorted(docs, key=_sort_key(sort))
+
+    seen, cursor = [], None
+    while True:
+        query = keyset_filter(sort, decode_cursor(cursor)) if cursor else {}
+        page = sorted((d for d in docs if _matches(d, query)), key=_sort_key(sort))[:4]
+        if not page:
+            break
+        seen.extend(page)
+        cursor = encode_cursor([page[-1].get(field) for field, _ in sort])
+
+    assert seen == expected
+
+
+def test_query_shape_drops_values_and_collapses_lists():
+    query = {
+        "user_id": "u1",
+        "due_date": {"$gte": datetime(2024, 1, 1)},
+        "status": {"$in": ["pending", "done"]},
+        "$or": [{"xp": {"$lt": 5}}, {"xp": {"$lt": 7}}, {"xp": None}],
+    }
+    assert query_shape(query) == {
+        "user_id": "?",
+        "due_date": {"$gte": "?"},
+        "status": {"$in": ["?"]},
+        "$or": [{"xp": {"$lt": "?"}}, {"xp": "?"}],
+    }
+    assert query_shape(None) == "?"
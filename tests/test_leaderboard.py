@@ -0,0 +1,83 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leaderboard import Leaderboard, RankedSet  # noqa: E402
+
+
+def test_ranked_set_matches_sorted_list():
+    rng = random.Random(1234)
+    ranked, expected = RankedSet(), []
+    for _ in range(5000):
+        key = (rng.randrange(-50, 0), "u%03d" % rng.randrange(300))
+        if key in expected and rng.random() < 0.5:
+            assert ranked.remove(key)
+            expected.remove(key)
+        elif key not in expected:
+            ranked.insert(key)
+            expected.append(key)
+        else:
+            assert not ranked.remove((1, "missing"))
+        expected.sort()
+
+        assert len(ranked) == len(expected)
+        probe = (rng.randrange(-51, 1), "u%03d" % rng.randrange(300))
+        below = sum(1 for k in expected if k < probe)
+        assert ranked.rank(probe) == below
+        assert ranked.rank(probe, inclusive=True) == below + (probe in expected)
+        start = rng.randrange(len(expected) + 2)
+        stop = start + rng.randrange(0, 20)
+        assert ranked.slice(start, stop) == expected[start:stop]
+
+    assert ranked.slice(0, len(expected)) == expected
+
+
+def test_leaderboard_ranks_pages_and_positions():
+    rng = random.Random(99)
+    board, xp = Leaderboard(), {}
+    for _ in range(2000):
+        user_id = "u%02d" % rng.randrange(80)
+        if rng.random() < 0.1:
+            board.remove(user_id)
+            xp.pop(user_id, None)
+        else:
+            xp[user_id] = rng.randrange(0, 40)
+            board.update(user_id, xp[user_id], name=user_id)
+
+    order = sorted(xp, key=lambda u: (-xp[u], u))
+    assert len(board) == len(order)
+    assert [row["user_id"] for row in board.page(0, len(order))] == order
+    assert [row["user_id"] for row in board.page(10, 5)] == order[10:15]
+    for position, user_id in enumerate(order):
+        assert board.rank(user_id) == position + 1
+        assert board.position_after(xp[user_id], user_id) == position + 1
+    assert board.rank("nobody") is None
+
+
+def test_replace_replays_changes_made_during_rebuild():
+    board = Leaderboard()
+    board.update("a", 10, "A")
+    board.update("b", 5, "B")
+
+    board.begin_rebuild()
+    fresh = Leaderboard()
+    fresh.update("a", 10, "A")  # the reload read "a" before its award below
+    board.update("a", 30)
+    board.update("c", 1, "C")  # created after the cursor passed it
+    fresh.update("b", 5, "B")
+    board.remove("b")
+    board.replace(fresh)
+
+    assert board.ready
+    assert board.get("a")["xp"] == 30
+    assert board.get("c") is not None
+    assert board.get("b") is None
+    assert [row["user_id"] for row in board.page(0, 10)] == ["a", "c"]
+
+    # Nothing is recorded once the rebuild is over
+    board.update("d", 2, "D")
+    other = Leaderboard()
+    board.replace(other)
+    assert board.get("d") is None
@@ -0,0 +1,40 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+
+import main  # noqa: E402
+from leaderboard import Leaderboard  # noqa: E402
+
+
+class _Users:
+    def __init__(self, docs):
+        self.docs = {doc["_id"]: doc for doc in docs}
+
+    async def find_one(self, query, projection=None):
+        return self.docs.get(query["_id"])
+
+
+def test_rank_keys_on_stored_id_whatever_the_path_case(monkeypatch):
+    user_id, other_id = ObjectId(), ObjectId()
+    users = _Users([
+        {"_id": user_id, "name": "Ada", "xp": 10, "streak": 1},
+        {"_id": other_id, "name": "Bob", "xp": 20, "streak": 0},
+    ])
+    loaded = Leaderboard()
+    loaded.update(str(other_id), 20, "Bob", 0)
+    board = Leaderboard()
+    board.replace(loaded)
+    monkeypatch.setattr(main, "db", {"user": users})
+    monkeypatch.setattr(main, "ranking", board)
+
+    first = asyncio.run(main.leaderboard_rank(str(user_id).upper(), k=5))
+    second = asyncio.run(main.leaderboard_rank(str(user_id), k=5))
+
+    assert len(board) == 2
+    assert first.rank == second.rank == 2
+    assert first.user.user_id == str(user_id)
+    assert [leader.user_id for leader in first.above] == [str(other_id)]
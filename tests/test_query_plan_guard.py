@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.testclient import TestClient  # noqa: E402
+
+import metrics  # noqa: E402
+from database import QueryPlanError, QueryPlanGuard, QueryPlanGuardMiddleware  # noqa: E402
+
+FLAGGED = {"command": "find", "collection": "task", "problems": ["COLLSCAN"]}
+
+
+def _app(guard, flag_before=False, flag_after=False):
+    async def app(scope, receive, send):
+        if flag_before:
+            guard._violations.setdefault(metrics.request_id.get(), []).append(FLAGGED)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"[", "more_body": True})
+        if flag_after:
+            # A streamed body runs its queries after the response has started
+            guard._violations.setdefault(metrics.request_id.get(), []).append(FLAGGED)
+        await send({"type": "http.response.body", "body": b"]"})
+
+    return metrics.RequestIdMiddleware(metrics.MetricsMiddleware(QueryPlanGuardMiddleware(app, guard), routes=[]))
+
+
+def test_flagged_request_fails_and_is_counted_as_500():
+    guard = QueryPlanGuard("raise")
+    client = TestClient(_app(guard, flag_before=True), raise_server_exceptions=False)
+    before = metrics.http_requests._values.get(("PATCH", metrics.UNMATCHED_ROUTE, "500"), 0)
+
+    assert client.patch("/", headers={"X-Request-ID": "r1"}).status_code == 500
+    assert metrics.http_requests._values[("PATCH", metrics.UNMATCHED_ROUTE, "500")] == before + 1
+    assert guard._violations == {}
+
+
+def test_violation_from_a_streamed_body_is_raised_and_not_left_behind():
+    guard = QueryPlanGuard("raise")
+    with pytest.raises(QueryPlanError):
+        TestClient(_app(guard, flag_after=True)).get("/", headers={"X-Request-ID": "r2"})
+    assert guard._violations == {}
+
+    # The same request id again, now with clean queries
+    assert TestClient(_app(guard)).get("/", headers={"X-Request-ID": "r2"}).status_code == 200